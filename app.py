@@ -8,63 +8,303 @@ import argparse
 import hashlib
 import time
 import signal
+import functools
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from fractions import Fraction
 from tqdm import tqdm
 
+# Try to import blake3 for faster file hashing, fallback to MD5
+try:
+    from blake3 import blake3
+    HAS_BLAKE3 = True
+except ImportError:
+    HAS_BLAKE3 = False
+
+# Try to import piexif for faster EXIF decoding of JPEG/TIFF files, fallback to exifread
+try:
+    import piexif
+    HAS_PIEXIF = True
+except ImportError:
+    HAS_PIEXIF = False
+
+# Try to import numpy and scipy for an in-memory KD-tree of locations, fallback to a grid index
+try:
+    import numpy as np
+    from scipy.spatial import cKDTree
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
 # Configuration
 LOCATIONS_FILE = 'cities500.txt'  # Geonames cities with population > 500
 DB_FILE = 'photo_metadata.db'
+HASH_CHUNK_SIZE = 1 << 20  # 1 MiB reads when hashing files
+PHOTO_BATCH_SIZE = 1000  # Photo rows buffered per executemany/commit
+LOCATION_BATCH_SIZE = 5000  # Location rows buffered per executemany during import
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.tiff', '.tif', '.raw', '.cr2', '.nef'})
+PROGRESS_BATCH_SIZE = 64  # Files per progress bar refresh
+SCHEMA_VERSION = 3  # Bump when migrate_database gains a new photos migration
+GRID_CELL_DEGREES = 0.25  # Cell size of the in-memory grid index used when scipy is unavailable
+METADATA_CHUNK_SIZE = 32  # Files per worker task (amortizes inter-process overhead)
+EXPORT_BATCH_SIZE = 10000  # Rows fetched per csv writerows() call during export
+STATEMENT_CACHE_SIZE = 256  # Compiled statements kept per connection (sqlite3 default is 128)
+
+# exifread's printable names for Image Orientation, so piexif rows match exifread rows
+ORIENTATION_NAMES = {
+    1: 'Horizontal (normal)',
+    2: 'Mirrored horizontal',
+    3: 'Rotated 180',
+    4: 'Mirrored vertical',
+    5: 'Mirrored horizontal then rotated 90 CCW',
+    6: 'Rotated 90 CW',
+    7: 'Mirrored horizontal then rotated 90 CW',
+    8: 'Rotated 90 CCW',
+}
+
+# SQL for inserting/updating a photo row
+PHOTO_INSERT_SQL = '''
+INSERT OR REPLACE INTO photos (
+    filename, filepath, datetime, camera_model, lens_model,
+    iso, fnumber, exposure_time, focal_length,
+    orientation, gps_lat, gps_lon, location,
+    status, file_hash, file_mtime, file_size, processed_at, error_message,
+    date_day, datetime_iso
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+PHOTO_LOCATION_COLUMN = 12  # Position of location in a PHOTO_INSERT_SQL row
+PHOTO_STATUS_COLUMN = 13  # Position of status ('processed' / 'failed') in a PHOTO_INSERT_SQL row
+NO_EXIF_FIELDS = (None,) * 11  # EXIF, GPS and location columns of a 'failed' row
+
+# Calendar day of an EXIF datetime ("YYYY:MM:DD HH:MM:SS" -> "YYYY-MM-DD"); SQLite's DATE()
+# can't parse the colon-separated form. New rows get date_day from photo_day() at ingest;
+# this expression backfills rows written before the column existed, so keep them in sync.
+PHOTO_DAY_SQL = "REPLACE(SUBSTR(datetime, 1, 10), ':', '-')"
+
+# The whole EXIF datetime with the same date normalization ("YYYY-MM-DD HH:MM:SS"), stored as
+# datetime_iso so it sorts and range-compares consistently; photo_datetime_iso() is its ingest twin
+PHOTO_DATETIME_ISO_SQL = f"{PHOTO_DAY_SQL} || SUBSTR(datetime, 11)"
+
+# SQL for inserting a location row during import
+LOCATION_INSERT_SQL = '''
+INSERT OR IGNORE INTO locations 
+(geonameid, name, asciiname, latitude, longitude, feature_class, feature_code, country_code, admin1_code, admin2_code)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
 
 # Global flag for graceful shutdown
 shutdown_requested = False
 
+# Cursor used by the cached location lookup (lru_cache can't hash cursors)
+_location_cursor = None
+
+# In-memory KD-tree over all locations and the geonameid for each tree point
+_location_tree = None
+_location_tree_ids = None
+
+# In-memory grid index: {(lat_cell, lon_cell): [(geonameid, latitude, longitude), ...]}
+_location_grid = None
+
 def signal_handler(signum, frame):
-    """Handle interrupt signals gracefully"""
+    """
+    Handle interrupt signals gracefully.
+    Only sets a flag: the processing loop checks it between files and commits its buffered
+    rows before returning, so a signal never lands in the middle of a batch write.
+    A second signal raises KeyboardInterrupt for an immediate exit (the worker pool is
+    still shut down, SQLite rolls back the unfinished batch, earlier batches stay committed).
+    """
     global shutdown_requested
     shutdown_requested = True
+    signal.signal(signum, signal.default_int_handler)
     print("\n\nShutdown requested. Finishing current operation and exiting gracefully...", flush=True)
+    print("(Press Ctrl+C again to stop immediately)", flush=True)
 
 # Helper: Convert GPS to decimal
 def dms_to_decimal(dms, ref):
-    # dms is a tuple of Rational numbers
-    degrees = float(dms[0].num) / float(dms[0].den)
-    minutes = float(dms[1].num) / float(dms[1].den)
-    seconds = float(dms[2].num) / float(dms[2].den)
-    dec = degrees + (minutes / 60.0) + (seconds / 3600.0)
-    if ref in ['S', 'W']:
-        dec = -dec
-    return dec
+    # dms is a tuple of exifread Ratio values, which convert directly with float()
+    degrees, minutes, seconds = float(dms[0]), float(dms[1]), float(dms[2])
+    dec = degrees + minutes / 60.0 + seconds / 3600.0
+    return -dec if ref and ref[0] in 'SW' else dec
 
 # Helper: Calculate distance between two GPS coordinates (Haversine formula)
-def haversine_distance(lat1, lon1, lat2, lon2):
-    """Calculate distance in kilometers between two GPS coordinates"""
+def haversine_distance(lat1, lon1, lat2, lon2, cos_lat1=None):
+    """
+    Calculate distance in kilometers between two GPS coordinates.
+    Pass cos_lat1 (cos of lat1 in radians) when scanning many points from the same origin.
+    """
     R = 6371  # Earth radius in kilometers
+    if cos_lat1 is None:
+        cos_lat1 = math.cos(math.radians(lat1))
     dlat = math.radians(lat2 - lat1)
     dlon = math.radians(lon2 - lon1)
-    a = math.sin(dlat/2)**2 + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
+    a = math.sin(dlat/2)**2 + cos_lat1 * math.cos(math.radians(lat2)) * math.sin(dlon/2)**2
     c = 2 * math.asin(math.sqrt(a))
     return R * c
 
+# Helper: Convert latitude/longitude (radians) to unit-sphere XYZ coordinates
+def latlon_to_xyz(lat_rad, lon_rad):
+    """Euclidean (chord) distance between XYZ points grows monotonically with great-circle distance"""
+    cos_lat = np.cos(lat_rad)
+    return np.column_stack([cos_lat * np.cos(lon_rad), cos_lat * np.sin(lon_rad), np.sin(lat_rad)])
+
 # Helper: Calculate file hash for change detection
 def calculate_file_hash(filepath):
-    """Calculate MD5 hash of file for change detection"""
+    """Calculate BLAKE3 hash of file for change detection (MD5 if blake3 is not installed)"""
+    return hash_file_with_head(filepath)[0]
+
+# Helper: Hash a file and keep its first chunk
+def hash_file_with_head(filepath):
+    """
+    Hash a file like calculate_file_hash and also return the bytes of its first chunk,
+    so EXIF parsing can reuse them instead of opening and reading the file again.
+    Returns (hexdigest, head_bytes), or (None, None) if the file can't be read.
+    """
+    head = None
     try:
-        hash_md5 = hashlib.md5()
         with open(filepath, "rb") as f:
-            # Read in chunks to handle large files
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
+            if HAS_BLAKE3:
+                # Let blake3 use multiple threads for files larger than one chunk
+                large_file = os.fstat(f.fileno()).st_size >= HASH_CHUNK_SIZE
+                hasher = blake3(max_threads=blake3.AUTO if large_file else 1)
+            else:
+                hasher = hashlib.md5()
+            # Every byte is read once front to back, so ask the kernel for aggressive readahead
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            # Read in 1 MiB chunks into a reusable buffer to keep read() calls low
+            buf = bytearray(HASH_CHUNK_SIZE)
+            view = memoryview(buf)
+            while True:
+                size = f.readinto(buf)
+                if not size:
+                    break
+                if head is None:
+                    head = bytes(view[:size])
+                hasher.update(view[:size])
+        return hasher.hexdigest(), head or b''
     except Exception:
-        return None
+        return None, None
 
-# Helper: Get file modification time
-def get_file_mtime(filepath):
-    """Get file modification time as timestamp"""
+# Helper: Get file modification time and size
+def get_file_stat(filepath):
+    """
+    Get file modification time and size with a single stat() call; (None, None) if unavailable.
+    Accepts an os.DirEntry too, reusing the stat data scandir already cached (free on Windows).
+    """
     try:
-        return os.path.getmtime(filepath)
+        st = filepath.stat() if isinstance(filepath, os.DirEntry) else os.stat(filepath)
+        return st.st_mtime, st.st_size
     except Exception:
-        return None
+        return None, None
+
+# Helper: Calendar day of an EXIF datetime, stored as date_day (same result as PHOTO_DAY_SQL)
+def photo_day(datetime_val):
+    return datetime_val[:10].replace(':', '-') if datetime_val else None
+
+# Helper: EXIF datetime with its date part normalized, stored as datetime_iso (same as PHOTO_DATETIME_ISO_SQL)
+def photo_datetime_iso(datetime_val):
+    return datetime_val[:10].replace(':', '-') + datetime_val[10:] if datetime_val else None
+
+# Helper: Wrap a batch of writes in a single explicit transaction
+@contextlib.contextmanager
+def batch_transaction(conn):
+    """
+    BEGIN/COMMIT around a batch on autocommit connections (isolation_level=None).
+    Connections that manage transactions implicitly, or are already in one, are left alone.
+    """
+    if conn.isolation_level is not None or conn.in_transaction:
+        yield
+        return
+    conn.execute('BEGIN')
+    try:
+        yield
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    conn.execute('COMMIT')
+
+# Helper: Write buffered location rows in one batch
+def flush_location_rows(cursor, rows):
+    """Insert buffered location rows with executemany and clear the buffer"""
+    if not rows:
+        return
+    with batch_transaction(cursor.connection):
+        cursor.executemany(LOCATION_INSERT_SQL, rows)
+    rows.clear()
+
+# Helper: Create the persistent location lookup cache
+def ensure_location_cache(cursor):
+    """Create location_cache, which keeps resolved (rounded lat, lon) -> location across runs"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS location_cache (
+        lat_q REAL,
+        lon_q REAL,
+        location TEXT,
+        PRIMARY KEY (lat_q, lon_q)
+    ) WITHOUT ROWID
+    ''')
+
+# Helper: Load the persistent location lookup cache
+def load_location_cache(cursor):
+    """Return {(lat_q, lon_q): location} from location_cache (location may be None: nothing nearby)"""
+    cursor.execute("SELECT lat_q, lon_q, location FROM location_cache")
+    return {(lat_q, lon_q): location for lat_q, lon_q, location in cursor}
+
+# Helper: Tune SQLite connection for bulk writes
+def configure_connection(conn, use_wal=True):
+    """
+    Apply WAL journaling and write-friendly PRAGMAs to a new connection.
+    Pass use_wal=False for databases on network filesystems, where WAL's shared memory index is unsafe.
+    """
+    conn.executescript(
+        f"PRAGMA journal_mode={'WAL' if use_wal else 'DELETE'}; "
+        "PRAGMA synchronous=NORMAL; "
+        "PRAGMA temp_store=MEMORY; "
+        "PRAGMA cache_size=-200000; "
+        "PRAGMA mmap_size=268435456;"
+    )
+
+# Helper: Open the photo database
+def open_database(db_file, use_wal=True):
+    """
+    Open db_file in autocommit mode (writes batch themselves with batch_transaction),
+    with a large statement cache and configure_connection's PRAGMAs applied.
+    """
+    conn = sqlite3.connect(db_file, isolation_level=None, cached_statements=STATEMENT_CACHE_SIZE)
+    configure_connection(conn, use_wal)
+    return conn
+
+# Helper: Write buffered photo rows in one batch
+def flush_photo_rows(cursor, conn, rows):
+    """Insert buffered photo rows with executemany, commit, and clear the buffer"""
+    if rows:
+        with batch_transaction(conn):
+            cursor.executemany(PHOTO_INSERT_SQL, rows)
+        rows.clear()
+    conn.commit()
+
+# Helper: Walk a directory tree yielding image file paths
+def iter_image_files(root):
+    """Recursively yield os.DirEntry objects for image files using os.scandir (no extra stat per entry)"""
+    try:
+        with os.scandir(root) as entries:
+            for entry in entries:
+                if shutdown_requested:
+                    return
+                if entry.is_dir(follow_symlinks=False):
+                    yield from iter_image_files(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_EXTENSIONS:
+                    yield entry
+    except OSError:
+        return  # Unreadable directory, skip it like os.walk does
+
+# Helper: Get the set of column names for a table
+def get_table_columns(cursor, table):
+    """Read PRAGMA table_info once and return the column names as a set"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return {row[1] for row in cursor.fetchall()}
 
 # Helper: Derive database filename from image directory
 def get_db_filename_from_folder(image_dir, default_db=None):
@@ -92,6 +332,21 @@ def get_db_filename_from_folder(image_dir, default_db=None):
     # Fallback to default if extraction fails
     return default_db or DB_FILE
 
+# Helper: Convert one cities500.txt record into a locations row
+def parse_location_fields(fields):
+    """
+    Build a locations row tuple from a split Geonames record.
+    Raises ValueError if the id or coordinates are missing or malformed.
+    """
+    latitude = float(fields[4])
+    longitude = float(fields[5])
+    return (
+        int(fields[0]), fields[1], fields[2], latitude, longitude,
+        fields[6], fields[7], fields[8],
+        fields[10] or None if len(fields) > 10 else None,  # admin1 code (field 11)
+        fields[11] or None if len(fields) > 11 else None,  # admin2 code (field 12)
+    )
+
 # Function: Import cities500.txt into database
 def import_locations_to_db(cursor, conn, locations_file=LOCATIONS_FILE):
     """
@@ -101,12 +356,13 @@ def import_locations_to_db(cursor, conn, locations_file=LOCATIONS_FILE):
     """
     global shutdown_requested
     
+    ensure_location_cache(cursor)
+    
     # Check if locations table already exists and has data
     cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='locations'")
     if cursor.fetchone():
         # Check if table needs migration (add admin1_code and admin2_code columns)
-        cursor.execute("PRAGMA table_info(locations)")
-        columns = [row[1] for row in cursor.fetchall()]
+        columns = get_table_columns(cursor, 'locations')
         
         if 'admin1_code' not in columns:
             print("Migrating locations table to add admin codes...", flush=True)
@@ -149,52 +405,46 @@ def import_locations_to_db(cursor, conn, locations_file=LOCATIONS_FILE):
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_lat ON locations(latitude)')
     cursor.execute('CREATE INDEX IF NOT EXISTS idx_lon ON locations(longitude)')
     
+    # Lookups cached against an older locations table are no longer valid
+    cursor.execute("DELETE FROM location_cache")
+    
     conn.commit()
     
     # Import data
     imported_count = 0
     error_count = 0
+    pending_rows = []
     
     try:
-        with open(locations_file, 'r', encoding='utf-8', errors='ignore') as f:
-            for line_num, line in enumerate(f, 1):
+        with open(locations_file, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            # Geonames files are plain tab-separated values with no quoting
+            reader = csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE)
+            for line_num, fields in enumerate(reader, 1):
                 if shutdown_requested:
                     print("\nLocation import interrupted by user", flush=True)
+                    flush_location_rows(cursor, pending_rows)
                     conn.commit()
                     return False
                 
+                if len(pending_rows) >= LOCATION_BATCH_SIZE:
+                    flush_location_rows(cursor, pending_rows)
+                
                 if line_num % 100000 == 0:
                     print(f"  Imported {imported_count:,} locations... ({line_num:,} lines processed)", flush=True)
                     conn.commit()  # Periodic commit
                 
-                fields = line.strip().split('\t')
                 if len(fields) < 9:
                     error_count += 1
                     continue
                 
                 try:
-                    geonameid = int(fields[0]) if fields[0] else None
-                    name = fields[1] if len(fields) > 1 else None
-                    asciiname = fields[2] if len(fields) > 2 else None
-                    latitude = float(fields[4]) if len(fields) > 4 and fields[4] else None
-                    longitude = float(fields[5]) if len(fields) > 5 and fields[5] else None
-                    feature_class = fields[6] if len(fields) > 6 else None
-                    feature_code = fields[7] if len(fields) > 7 else None
-                    country_code = fields[8] if len(fields) > 8 else None
-                    admin1_code = fields[10] if len(fields) > 10 and fields[10] else None  # Field 11 (0-indexed: 10)
-                    admin2_code = fields[11] if len(fields) > 11 and fields[11] else None  # Field 12 (0-indexed: 11)
-                    
-                    if geonameid and latitude is not None and longitude is not None:
-                        cursor.execute('''
-                        INSERT OR IGNORE INTO locations 
-                        (geonameid, name, asciiname, latitude, longitude, feature_class, feature_code, country_code, admin1_code, admin2_code)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        ''', (geonameid, name, asciiname, latitude, longitude, feature_class, feature_code, country_code, admin1_code, admin2_code))
-                        imported_count += 1
+                    pending_rows.append(parse_location_fields(fields))
+                    imported_count += 1
                 except (ValueError, IndexError) as e:
                     error_count += 1
                     continue
         
+        flush_location_rows(cursor, pending_rows)
         conn.commit()
         print(f"\nLocation import complete: {imported_count:,} locations imported", flush=True)
         if error_count > 0:
@@ -227,79 +477,216 @@ def format_location_string(name, admin1_code, country_code):
     
     return ", ".join(parts)
 
-# Helper: Find nearest location using database query
-def find_nearest_location(lat, lon, cursor, max_distance_km=50):
+# Helper: Grid cell key for a coordinate
+def grid_cell(lat, lon):
+    """Map a coordinate to its (lat_cell, lon_cell) key in the in-memory grid index"""
+    return int(math.floor(lat / GRID_CELL_DEGREES)), int(math.floor(lon / GRID_CELL_DEGREES))
+
+# Function: Build the in-memory location index
+def build_location_index(cursor):
     """
-    Find the nearest location from database based on GPS coordinates.
-    Uses SQL query with bounding box for fast lookup.
-    Returns formatted location string like "Cincinnati, OH, USA" or None if no location found within max_distance_km.
+    Load all location coordinates into memory once per run.
+    Uses a cKDTree on unit-sphere XYZ coordinates when scipy is available,
+    otherwise a dict of grid cells for hash-table candidate lookup.
+    Returns 'kdtree', 'grid', or None if the locations table is empty or missing.
     """
-    global shutdown_requested
+    global _location_tree, _location_tree_ids, _location_grid
+    _location_tree = _location_tree_ids = _location_grid = None
     
-    if shutdown_requested:
+    try:
+        cursor.execute("SELECT geonameid, latitude, longitude FROM locations")
+        rows = cursor.fetchall()
+    except sqlite3.Error:
+        return None
+    
+    if not rows:
         return None
     
+    if HAS_SCIPY:
+        ids, lats, lons = zip(*rows)
+        _location_tree_ids = np.array(ids, dtype=np.int64)
+        _location_tree = cKDTree(latlon_to_xyz(np.radians(lats), np.radians(lons)))
+        return 'kdtree'
+    
+    grid = {}
+    for row in rows:
+        grid.setdefault(grid_cell(row[1], row[2]), []).append(row)
+    _location_grid = grid
+    return 'grid'
+
+# Helper: Find nearest location using the in-memory KD-tree
+def find_nearest_location_tree(lat, lon, cursor, max_distance_km=50):
+    """
+    Find the nearest location with a KD-tree query, then fetch its name fields from the database.
+    Returns formatted location string or None if nothing is within max_distance_km.
+    """
+    R = 6371  # Earth radius in kilometers
     try:
-        # Calculate bounding box (rough approximation: 1 degree ≈ 111 km)
-        # Add some buffer for the max_distance
-        lat_buffer = max_distance_km / 111.0
-        lon_buffer = max_distance_km / (111.0 * abs(math.cos(math.radians(lat))))
-        
-        # Query locations within bounding box - get all needed fields for formatting
-        query = '''
-        SELECT name, latitude, longitude, admin1_code, country_code
-        FROM locations
-        WHERE latitude BETWEEN ? AND ?
-          AND longitude BETWEEN ? AND ?
-        '''
+        point = latlon_to_xyz(np.radians([lat]), np.radians([lon]))
+        chord, idx = _location_tree.query(point, k=1)
+        # Chord length on the unit sphere -> great-circle distance
+        distance = 2 * R * math.asin(min(float(chord[0]) / 2, 1.0))
+        if distance > max_distance_km:
+            return None
         
-        cursor.execute(query, (
-            lat - lat_buffer,
-            lat + lat_buffer,
-            lon - lon_buffer,
-            lon + lon_buffer
-        ))
+        cursor.execute(
+            "SELECT name, admin1_code, country_code FROM locations WHERE geonameid = ?",
+            (int(_location_tree_ids[idx[0]]),)
+        )
+        row = cursor.fetchone()
+        return format_location_string(*row) if row else None
+    except Exception as e:
+        print(f"ERROR: Error querying location tree: {e}", flush=True)
+        return None
+
+# Helper: Find nearest location using the in-memory grid index
+def find_nearest_location_grid(lat, lon, cursor, max_distance_km=50):
+    """
+    Find the nearest location by probing only the grid cells that cover the search radius.
+    Returns formatted location string or None if nothing is within max_distance_km.
+    """
+    try:
+        lat_buffer = max_distance_km / 111.0
+        lon_buffer = min(180.0, max_distance_km / (111.0 * max(abs(math.cos(math.radians(lat))), 1e-6)))
+        min_lat_cell, min_lon_cell = grid_cell(lat - lat_buffer, max(-180.0, lon - lon_buffer))
+        max_lat_cell, max_lon_cell = grid_cell(lat + lat_buffer, min(180.0, lon + lon_buffer))
         
-        candidates = cursor.fetchall()
+        candidates = []
+        for lat_cell in range(min_lat_cell, max_lat_cell + 1):
+            for lon_cell in range(min_lon_cell, max_lon_cell + 1):
+                candidates.extend(_location_grid.get((lat_cell, lon_cell), ()))
         
         if not candidates:
             return None
         
-        # Find the closest candidate using Haversine formula
-        nearest_location_data = None
-        min_distance = float('inf')
-        
-        for name, loc_lat, loc_lon, admin1_code, country_code in candidates:
-            if shutdown_requested:
-                return None
-            
-            distance = haversine_distance(lat, lon, loc_lat, loc_lon)
-            
-            if distance < min_distance:
-                min_distance = distance
-                nearest_location_data = (name, admin1_code, country_code)
-                
-                # If we found a very close match, we can break early
-                if distance < 0.5:  # Within 500m
-                    break
-        
-        if min_distance <= max_distance_km and nearest_location_data:
-            name, admin1_code, country_code = nearest_location_data
-            return format_location_string(name, admin1_code, country_code)
-        else:
+        cos_lat = math.cos(math.radians(lat))  # Constant for every candidate
+        distance, geonameid = min(
+            (haversine_distance(lat, lon, loc_lat, loc_lon, cos_lat), geonameid)
+            for geonameid, loc_lat, loc_lon in candidates
+        )
+        if distance > max_distance_km:
             return None
-            
+        
+        cursor.execute(
+            "SELECT name, admin1_code, country_code FROM locations WHERE geonameid = ?",
+            (geonameid,)
+        )
+        row = cursor.fetchone()
+        return format_location_string(*row) if row else None
     except Exception as e:
-        print(f"ERROR: Error querying location database: {e}", flush=True)
+        print(f"ERROR: Error querying location grid: {e}", flush=True)
         return None
 
+# Helper: Cached location lookup keyed on rounded coordinates
+@functools.lru_cache(maxsize=4096)
+def _lookup_nearest(lat_q, lon_q, max_distance_km=50):
+    """
+    Run the nearest-location lookup for already-rounded coordinates against the in-memory index.
+    build_location_index only leaves both indexes unset when the locations table is empty or
+    missing, in which case there is nothing to match and the result is None.
+    """
+    if _location_tree is not None:
+        return find_nearest_location_tree(lat_q, lon_q, _location_cursor, max_distance_km)
+    if _location_grid is not None:
+        return find_nearest_location_grid(lat_q, lon_q, _location_cursor, max_distance_km)
+    return None
+
+def find_nearest_location_cached(lat, lon, cursor, max_distance_km=50):
+    """
+    Cached nearest-location lookup (see _lookup_nearest).
+    Coordinates are rounded to 4 decimals (~11 m) so bursts of photos from one spot share a single query.
+    """
+    global _location_cursor
+    _location_cursor = cursor
+    return _lookup_nearest(round(lat, 4), round(lon, 4), max_distance_km)
+
+# Helper: Resolve many photo locations, looking up each distinct fix once
+def find_nearest_locations_grouped(points, cursor, max_distance_km=50):
+    """
+    Look up locations for a list of (lat, lon) points.
+    Identical fixes (rounded to 4 decimals, like the cache) are resolved once.
+    Every point is resolved even after a shutdown request: the lookups are in-memory, and
+    the batch being flushed must not be written as 'processed' without its locations.
+    Returns a list of location strings (or None) aligned with points.
+    """
+    keys = [(round(lat, 4), round(lon, 4)) for lat, lon in points]
+    resolved = {key: find_nearest_location_cached(key[0], key[1], cursor, max_distance_km) for key in set(keys)}
+    return [resolved[key] for key in keys]
+
+# Helper: Fill in the location column of buffered photo rows
+def resolve_pending_locations(cursor, conn, rows, pending, known_locations):
+    """
+    Geocode (row_index, lat, lon) entries, patch rows in place, and clear pending.
+    known_locations is the persistent cache loaded with load_location_cache; misses are
+    resolved in one grouped pass and written back to location_cache for later runs.
+    """
+    if not pending:
+        return
+    keys = [(round(lat, 4), round(lon, 4)) for _, lat, lon in pending]
+    misses = list({key for key in keys if key not in known_locations})
+    resolved = {}
+    if misses:
+        resolved = dict(zip(misses, find_nearest_locations_grouped(misses, cursor)))
+        known_locations.update(resolved)
+        with batch_transaction(conn):
+            cursor.executemany(
+                "INSERT OR REPLACE INTO location_cache (lat_q, lon_q, location) VALUES (?, ?, ?)",
+                [(lat_q, lon_q, location) for (lat_q, lon_q), location in resolved.items()]
+            )
+    for (row_idx, _, _), key in zip(pending, keys):
+        location = resolved[key] if key in resolved else known_locations[key]
+        row = rows[row_idx]
+        rows[row_idx] = row[:PHOTO_LOCATION_COLUMN] + (location,) + row[PHOTO_LOCATION_COLUMN + 1:]
+    pending.clear()
+
+# Helper: Geocode and write buffered photo rows, falling back to one insert per row
+def write_photo_batch(cursor, conn, rows, pending, known_locations):
+    """
+    resolve_pending_locations + flush_photo_rows, clearing both buffers.
+    If the batch fails, its rows are inserted one at a time so a single bad row doesn't lose
+    the rest. Returns the rows that could not be written.
+    """
+    try:
+        resolve_pending_locations(cursor, conn, rows, pending, known_locations)
+        flush_photo_rows(cursor, conn, rows)
+        return []
+    except Exception as e:
+        print(f"\nWARNING: Could not write batch of {len(rows)} photos ({e}), retrying one at a time", flush=True)
+    
+    pending.clear()
+    dropped = []
+    for row in rows:
+        try:
+            cursor.execute(PHOTO_INSERT_SQL, row)
+        except Exception as e:
+            print(f"ERROR: Could not record {row[1]}: {e}", flush=True)
+            dropped.append(row)
+    rows.clear()
+    try:
+        conn.commit()
+    except Exception as e:
+        print(f"ERROR: Could not commit photo rows: {e}", flush=True)
+    return dropped
+
+# Helper: Move photos whose rows could not be written from the processed to the failed count
+def count_dropped_rows(dropped, image_count, error_count):
+    """Return (image_count, error_count) adjusted for rows returned by write_photo_batch"""
+    for row in dropped:
+        if row[PHOTO_STATUS_COLUMN] == 'processed':
+            image_count -= 1
+            error_count += 1
+    return image_count, error_count
+
 # Function: Migrate database schema if needed
 def migrate_database(cursor):
     """Add new columns to existing database if they don't exist"""
     try:
-        # Check if status column exists
-        cursor.execute("PRAGMA table_info(photos)")
-        columns = [row[1] for row in cursor.fetchall()]
+        # Databases already at the current schema version need no column checks
+        cursor.execute("PRAGMA user_version")
+        if cursor.fetchone()[0] >= SCHEMA_VERSION:
+            return False
+        
+        columns = get_table_columns(cursor, 'photos')
         
         migrations = []
         if 'status' not in columns:
@@ -308,35 +695,219 @@ def migrate_database(cursor):
             migrations.append("ALTER TABLE photos ADD COLUMN file_hash TEXT")
         if 'file_mtime' not in columns:
             migrations.append("ALTER TABLE photos ADD COLUMN file_mtime REAL")
+        if 'file_size' not in columns:
+            migrations.append("ALTER TABLE photos ADD COLUMN file_size INTEGER")
         if 'processed_at' not in columns:
             migrations.append("ALTER TABLE photos ADD COLUMN processed_at TEXT")
         if 'error_message' not in columns:
             migrations.append("ALTER TABLE photos ADD COLUMN error_message TEXT")
+        if 'date_day' not in columns:
+            migrations.append("ALTER TABLE photos ADD COLUMN date_day TEXT")
+        if 'datetime_iso' not in columns:
+            migrations.append("ALTER TABLE photos ADD COLUMN datetime_iso TEXT")
         
         for migration in migrations:
             cursor.execute(migration)
         
+        # Fill date_day / datetime_iso for rows written before the columns existed
+        cursor.execute(f"UPDATE photos SET date_day = {PHOTO_DAY_SQL} WHERE date_day IS NULL AND datetime IS NOT NULL")
+        cursor.execute(f"UPDATE photos SET datetime_iso = {PHOTO_DATETIME_ISO_SQL} WHERE datetime_iso IS NULL AND datetime IS NOT NULL")
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         return len(migrations) > 0
     except Exception as e:
         print(f"WARNING: Database migration issue: {e}", flush=True)
         return False
 
+# Helper: Push accumulated progress to the bar in one refresh
+def flush_progress(pbar, pending, processed, skipped, errors):
+    """Advance the progress bar by pending files, update its counters, and return 0 (the new pending count)"""
+    if pending:
+        pbar.update(pending)
+    pbar.set_postfix({'processed': processed, 'skipped': skipped, 'errors': errors})
+    return 0
+
+# Helper: Ignore Ctrl+C in worker processes (the main process coordinates shutdown)
+def worker_init():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+# Helper: Read the EXIF fields we store with exifread
+def read_exifread_fields(filepath):
+    """
+    Decode EXIF tags with exifread.
+    Returns (exif_fields, gps_lat, gps_lon) in the order used by PHOTO_INSERT_SQL.
+    """
+    with open(filepath, 'rb') as f:
+        tags = exifread.process_file(f, details=False)
+    
+    # Date / Time
+    datetime_val = tags.get('EXIF DateTimeOriginal') or tags.get('Image DateTime')
+    datetime_val = str(datetime_val) if datetime_val else None
+    
+    # Camera / Phone
+    camera_model = tags.get('Image Model')
+    camera_model = str(camera_model) if camera_model else None
+    
+    # Lens info
+    lens_model = tags.get('EXIF LensModel')
+    lens_model = str(lens_model) if lens_model else None
+    
+    # ISO, FNumber, Exposure
+    iso = str(tags.get('EXIF ISOSpeedRatings')) if 'EXIF ISOSpeedRatings' in tags else None
+    fnumber = str(tags.get('EXIF FNumber')) if 'EXIF FNumber' in tags else None
+    exposure_time = str(tags.get('EXIF ExposureTime')) if 'EXIF ExposureTime' in tags else None
+    focal_length = str(tags.get('EXIF FocalLength')) if 'EXIF FocalLength' in tags else None
+    orientation = str(tags.get('Image Orientation')) if 'Image Orientation' in tags else None
+    
+    # GPS
+    gps_lat = gps_lon = None
+    if 'GPS GPSLatitude' in tags and 'GPS GPSLongitude' in tags:
+        try:
+            gps_lat = dms_to_decimal(tags['GPS GPSLatitude'].values, str(tags.get('GPS GPSLatitudeRef')))
+            gps_lon = dms_to_decimal(tags['GPS GPSLongitude'].values, str(tags.get('GPS GPSLongitudeRef')))
+        except Exception as gps_error:
+            gps_lat = gps_lon = None  # GPS extraction failed, continue without location
+    
+    exif_fields = (datetime_val, camera_model, lens_model, iso, fnumber,
+                   exposure_time, focal_length, orientation)
+    return exif_fields, gps_lat, gps_lon
+
+# Helper: Format a piexif ASCII value the way exifread prints it
+def piexif_text(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', errors='replace')
+    return str(value).strip('\x00 ') or None
+
+# Helper: Format a piexif (numerator, denominator) pair the way exifread prints it
+def piexif_ratio(value):
+    if value is None:
+        return None
+    num, den = value
+    if den == 0:
+        return f"{num}/{den}"
+    return str(Fraction(num, den))
+
+# Helper: Read the EXIF fields we store from a piexif.load() dict
+def read_piexif_fields(exif):
+    """
+    Map piexif's integer-keyed IFDs onto the same strings exifread produces,
+    so rows stay comparable whichever decoder handled the file.
+    Returns (exif_fields, gps_lat, gps_lon) in the order used by PHOTO_INSERT_SQL.
+    """
+    ifd0 = exif.get('0th') or {}
+    exif_ifd = exif.get('Exif') or {}
+    gps_ifd = exif.get('GPS') or {}
+    
+    # Date / Time
+    datetime_val = piexif_text(exif_ifd.get(piexif.ExifIFD.DateTimeOriginal) or ifd0.get(piexif.ImageIFD.DateTime))
+    
+    # Camera / Phone, Lens info
+    camera_model = piexif_text(ifd0.get(piexif.ImageIFD.Model))
+    lens_model = piexif_text(exif_ifd.get(piexif.ExifIFD.LensModel))
+    
+    # ISO, FNumber, Exposure
+    iso = exif_ifd.get(piexif.ExifIFD.ISOSpeedRatings)
+    if isinstance(iso, tuple):
+        iso = str(list(iso)) if len(iso) > 1 else (str(iso[0]) if iso else None)
+    elif iso is not None:
+        iso = str(iso)
+    fnumber = piexif_ratio(exif_ifd.get(piexif.ExifIFD.FNumber))
+    exposure_time = piexif_ratio(exif_ifd.get(piexif.ExifIFD.ExposureTime))
+    focal_length = piexif_ratio(exif_ifd.get(piexif.ExifIFD.FocalLength))
+    orientation = ifd0.get(piexif.ImageIFD.Orientation)
+    if orientation is not None:
+        orientation = ORIENTATION_NAMES.get(orientation, str(orientation))
+    
+    # GPS
+    gps_lat = gps_lon = None
+    if piexif.GPSIFD.GPSLatitude in gps_ifd and piexif.GPSIFD.GPSLongitude in gps_ifd:
+        try:
+            lat_dms = [Fraction(num, den) for num, den in gps_ifd[piexif.GPSIFD.GPSLatitude]]
+            lon_dms = [Fraction(num, den) for num, den in gps_ifd[piexif.GPSIFD.GPSLongitude]]
+            gps_lat = dms_to_decimal(lat_dms, piexif_text(gps_ifd.get(piexif.GPSIFD.GPSLatitudeRef)))
+            gps_lon = dms_to_decimal(lon_dms, piexif_text(gps_ifd.get(piexif.GPSIFD.GPSLongitudeRef)))
+        except Exception:
+            gps_lat = gps_lon = None  # GPS extraction failed, continue without location
+    
+    exif_fields = (datetime_val, camera_model, lens_model, iso, fnumber,
+                   exposure_time, focal_length, orientation)
+    return exif_fields, gps_lat, gps_lon
+
+# Function: Extract metadata from a single image (runs in a worker process)
+def extract_metadata(filepath):
+    """
+    Read EXIF tags, decode GPS and hash a single image file.
+    Returns plain picklable values so it can run in a worker process:
+    (status, file_hash, exif_fields, gps_lat, gps_lon, error_message)
+    """
+    file_hash = None
+    try:
+        file_hash, head = hash_file_with_head(filepath)
+        
+        exif = None
+        if HAS_PIEXIF:
+            # JPEG EXIF lives in the APP1 segment at the start of the file, which the
+            # hashing pass already read; other formats (and unusually large headers) go by path
+            sources = [head, filepath] if head and head[:2] == b'\xff\xd8' else [filepath]
+            for source in sources:
+                try:
+                    exif = piexif.load(source)
+                    break
+                except Exception:
+                    exif = None  # Not a JPEG/TIFF piexif understands, let exifread try
+        
+        if exif is not None:
+            exif_fields, gps_lat, gps_lon = read_piexif_fields(exif)
+        else:
+            exif_fields, gps_lat, gps_lon = read_exifread_fields(filepath)
+        return 'processed', file_hash, exif_fields, gps_lat, gps_lon, None
+    
+    except exifread.ExifReadError as e:
+        return 'failed', file_hash, None, None, None, f"EXIF read error: {str(e)}"
+    except Exception as e:
+        return 'failed', file_hash, None, None, None, f"Processing error: {str(e)}"
+
+# Helper: Run extract_metadata over a chunk of files (one worker task per chunk)
+def extract_metadata_batch(filepaths):
+    return [extract_metadata(filepath) for filepath in filepaths]
+
+# Helper: Stream metadata from the worker pool with bounded read-ahead
+def iter_metadata(executor, filepaths, max_pending):
+    """
+    Yield extract_metadata results in input order.
+    At most max_pending chunks are queued in the pool, so workers stay ahead of the
+    database writer without buffering a whole library's results in memory.
+    """
+    pending = deque()
+    for start in range(0, len(filepaths), METADATA_CHUNK_SIZE):
+        pending.append(executor.submit(extract_metadata_batch, filepaths[start:start + METADATA_CHUNK_SIZE]))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
 # Function: Process images and extract EXIF data
-def process_images(image_dir, db_file=DB_FILE, force_reprocess=False, skip_location_lookup=False):
+def process_images(image_dir, db_file=DB_FILE, force_reprocess=False, skip_location_lookup=False, workers=None, use_wal=True):
     """Extract EXIF data from images and store in SQLite database"""
     
     print(f"\nStarting image processing...", flush=True)
     print(f"  Directory: {image_dir}", flush=True)
     print(f"  Database: {db_file}", flush=True)
     print(f"  Force reprocess: {force_reprocess}", flush=True)
-    print(f"  Skip location lookup: {skip_location_lookup}\n", flush=True)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    print(f"  Skip location lookup: {skip_location_lookup}", flush=True)
+    print(f"  Workers: {workers}\n", flush=True)
     
     if not os.path.exists(image_dir):
         print(f"ERROR: Directory '{image_dir}' does not exist.", flush=True)
         return False
     
-    # Connect to SQLite
-    conn = sqlite3.connect(db_file)
+    # Connect to SQLite in autocommit mode; batched writes use explicit BEGIN/COMMIT
+    conn = open_database(db_file, use_wal)
     cursor = conn.cursor()
     
     # Create table with all columns
@@ -359,23 +930,49 @@ def process_images(image_dir, db_file=DB_FILE, force_reprocess=False, skip_locat
         status TEXT DEFAULT 'processed',
         file_hash TEXT,
         file_mtime REAL,
+        file_size INTEGER,
         processed_at TEXT,
-        error_message TEXT
+        error_message TEXT,
+        date_day TEXT,
+        datetime_iso TEXT
     )
     ''')
     
     # Migrate existing database
     migrated = migrate_database(cursor)
+    
+    # Covering index for the resume query below, so it reads the index instead of every row
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_photos_status_file
+    ON photos(status, filepath, file_mtime, file_size)
+    ''')
+    
+    # Indexes that let the grouped exports walk groups in order instead of sorting every row
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_photos_dateday_loc ON photos(date_day, location, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_photos_location ON photos(location)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_photos_dtiso ON photos(datetime_iso)")
     conn.commit()
     
     # Import location data if needed and location lookup is enabled
     if not skip_location_lookup and os.path.exists(LOCATIONS_FILE):
         import_locations_to_db(cursor, conn)
     
+    # Start each run with an empty location cache (locations table may have changed)
+    _lookup_nearest.cache_clear()
+    
+    # Build the in-memory location index once for the whole run
+    known_locations = {}
+    if not skip_location_lookup:
+        index_type = build_location_index(cursor)
+        if index_type:
+            print(f"Built in-memory location index ({index_type})", flush=True)
+        ensure_location_cache(cursor)
+        known_locations = load_location_cache(cursor)
+    
     # Get set of already processed files (for resume capability)
     if not force_reprocess:
-        cursor.execute("SELECT filepath, file_mtime, file_hash FROM photos WHERE status = 'processed'")
-        processed_files = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        cursor.execute("SELECT filepath, file_mtime, file_size FROM photos WHERE status = 'processed'")
+        processed_files = {row[0]: (row[1], row[2]) for row in cursor}
         print(f"Found {len(processed_files)} already processed files (will skip unchanged)", flush=True)
     else:
         processed_files = {}
@@ -391,194 +988,130 @@ def process_images(image_dir, db_file=DB_FILE, force_reprocess=False, skip_locat
     image_count = 0
     skipped_count = 0
     error_count = 0
+    unrecorded_count = 0  # Rows that could not be written to the database
     gps_count = 0
     new_count = 0
     updated_count = 0
+    pending_rows = []  # Photo rows waiting for the next batched write
+    pending_locations = []  # (row index, lat, lon) geocoded together just before each write
+    pbar_pending = 0  # Files finished since the last progress bar refresh
     
-    # Collect all image files first
+    # Scan and quick-check in a single pass (total is unknown until the scan finishes)
     print(f"\nScanning images in: {image_dir}...", flush=True)
-    all_image_files = []
-    for root, dirs, files in os.walk(image_dir):
+    pbar = tqdm(desc="Processing images", unit="image", ncols=100, mininterval=0.25, smoothing=0.1)
+    
+    # Quick-check pass: stat every file and keep only new or changed ones
+    total_files = 0
+    files_to_process = []
+    for entry in iter_image_files(image_dir):
         if shutdown_requested:
             break
-        for file in files:
-            if not file.lower().endswith(('.jpg', '.jpeg', '.png', '.tiff', '.tif', '.raw', '.cr2', '.nef')):
+        
+        total_files += 1
+        
+        # Check if file still exists (one stat() gives us mtime and size too)
+        filepath = entry.path
+        file_mtime, file_size = get_file_stat(entry)
+        if file_mtime is None:
+            error_count += 1
+            pbar_pending += 1
+            continue
+        
+        # Check if already processed (unless force_reprocess)
+        if not force_reprocess and filepath in processed_files:
+            stored_mtime, stored_size = processed_files[filepath]
+            
+            # Quick check: unchanged mtime + size means unchanged file, no hashing needed
+            # (rows from before file_size was tracked only compare mtime)
+            if stored_mtime and file_mtime == stored_mtime and (stored_size is None or file_size == stored_size):
+                skipped_count += 1
+                pbar_pending += 1
+                if pbar_pending >= PROGRESS_BATCH_SIZE:
+                    pbar_pending = flush_progress(pbar, pbar_pending, image_count, skipped_count, error_count)
                 continue
-            filepath = os.path.join(root, file)
-            all_image_files.append(filepath)
+            else:
+                # File changed, will reprocess
+                updated_count += 1
+        
+        files_to_process.append((filepath, entry.name, file_mtime, file_size))
     
-    total_files = len(all_image_files)
-    print(f"Found {total_files} image files to process\n", flush=True)
+    # Scan finished: give the progress bar its total
+    pbar.total = total_files
+    pbar_pending = flush_progress(pbar, pbar_pending, image_count, skipped_count, error_count)
+    print(f"\nFound {total_files} image files ({len(files_to_process)} to process)\n", flush=True)
     
-    # Process each file with progress bar
-    pbar = tqdm(total=total_files, desc="Processing images", unit="image", ncols=100)
+    # Fan EXIF parsing and hashing out to worker processes; geocoding and DB writes stay here
+    executor = None
+    paths = [item[0] for item in files_to_process]
+    if workers > 1 and len(paths) > 1 and not shutdown_requested:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=worker_init)
+        results = iter_metadata(executor, paths, max_pending=4 * workers)
+    else:
+        results = map(extract_metadata, paths)
     
-    for idx, filepath in enumerate(all_image_files, 1):
-        # Check for shutdown request
-        if shutdown_requested:
-            print(f"\nShutdown requested. Processed {image_count} files before stopping.", flush=True)
-            pbar.close()
-            conn.commit()
-            conn.close()
-            return False
-        
-        try:
-            # Check if file still exists
-            if not os.path.exists(filepath):
-                error_count += 1
-                pbar.update(1)
-                continue
-            
-            # Check if already processed (unless force_reprocess)
-            if not force_reprocess and filepath in processed_files:
-                stored_mtime, stored_hash = processed_files[filepath]
-                current_mtime = get_file_mtime(filepath)
-                
-                # Check if file has changed
-                if current_mtime and stored_mtime and current_mtime == stored_mtime:
-                    skipped_count += 1
-                    pbar.update(1)
-                    pbar.set_postfix({'processed': image_count, 'skipped': skipped_count, 'errors': error_count})
-                    continue
-                else:
-                    # File changed, will reprocess
-                    updated_count += 1
+    try:
+        for (filepath, filename, file_mtime, file_size), result in zip(files_to_process, results):
+            # Check for shutdown request
+            if shutdown_requested:
+                print(f"\nShutdown requested. Processed {image_count} files before stopping.", flush=True)
+                flush_progress(pbar, pbar_pending, image_count, skipped_count, error_count)
+                pbar.close()
+                resolve_pending_locations(cursor, conn, pending_rows, pending_locations, known_locations)
+                flush_photo_rows(cursor, conn, pending_rows)
+                conn.close()
+                return False
             
-            file_hash = calculate_file_hash(filepath)
-            file_mtime = get_file_mtime(filepath)
+            status, file_hash, exif_fields, gps_lat, gps_lon, error_msg = result
+            processed_at = datetime.now().isoformat()
             
-            try:
-                with open(filepath, 'rb') as f:
-                    tags = exifread.process_file(f, details=False)
-                    
-                    # Date / Time
-                    datetime_val = tags.get('EXIF DateTimeOriginal') or tags.get('Image DateTime')
-                    datetime_val = str(datetime_val) if datetime_val else None
-                    
-                    # Camera / Phone
-                    camera_model = tags.get('Image Model')
-                    camera_model = str(camera_model) if camera_model else None
-                    
-                    # Lens info
-                    lens_model = tags.get('EXIF LensModel')
-                    lens_model = str(lens_model) if lens_model else None
-                    
-                    # ISO, FNumber, Exposure
-                    iso = str(tags.get('EXIF ISOSpeedRatings')) if 'EXIF ISOSpeedRatings' in tags else None
-                    fnumber = str(tags.get('EXIF FNumber')) if 'EXIF FNumber' in tags else None
-                    exposure_time = str(tags.get('EXIF ExposureTime')) if 'EXIF ExposureTime' in tags else None
-                    focal_length = str(tags.get('EXIF FocalLength')) if 'EXIF FocalLength' in tags else None
-                    orientation = str(tags.get('Image Orientation')) if 'Image Orientation' in tags else None
-                    
-                    # GPS
-                    gps_lat = gps_lon = None
-                    location = None
-                    
-                    if 'GPS GPSLatitude' in tags and 'GPS GPSLongitude' in tags:
-                        try:
-                            gps_lat = dms_to_decimal(tags['GPS GPSLatitude'].values, str(tags.get('GPS GPSLatitudeRef')))
-                            gps_lon = dms_to_decimal(tags['GPS GPSLongitude'].values, str(tags.get('GPS GPSLongitudeRef')))
-                            gps_count += 1
-                            
-                            # Look up location (unless skipped)
-                            if not skip_location_lookup:
-                                location = find_nearest_location(gps_lat, gps_lon, cursor)
-                        except Exception as gps_error:
-                            pass  # GPS extraction failed, continue without location
-                    
-                    # Insert or update in DB
-                    processed_at = datetime.now().isoformat()
-                    
-                    cursor.execute('''
-                    INSERT OR REPLACE INTO photos (
-                        filename, filepath, datetime, camera_model, lens_model,
-                        iso, fnumber, exposure_time, focal_length,
-                        orientation, gps_lat, gps_lon, location,
-                        status, file_hash, file_mtime, processed_at, error_message
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        os.path.basename(filepath), filepath, datetime_val, camera_model, lens_model,
-                        iso, fnumber, exposure_time, focal_length,
-                        orientation, gps_lat, gps_lon, location,
-                        'processed', file_hash, file_mtime, processed_at, None
-                    ))
-                    
-                    image_count += 1
-                    if filepath not in processed_files:
-                        new_count += 1
-                    
-                    # Commit periodically (every 500 files) for fault tolerance
-                    if image_count % 500 == 0:
-                        conn.commit()
-                    
-                    # Update progress bar
-                    pbar.update(1)
-                    pbar.set_postfix({'processed': image_count, 'skipped': skipped_count, 'errors': error_count})
-                        
-            except exifread.ExifReadError as e:
-                # Corrupted EXIF data - still record the file
-                error_msg = f"EXIF read error: {str(e)}"
+            if status == 'processed':
+                # Queue the location lookup (unless skipped) so nearby photos are resolved together
+                if gps_lat is not None and gps_lon is not None:
+                    gps_count += 1
+                    if not skip_location_lookup:
+                        pending_locations.append((len(pending_rows), gps_lat, gps_lon))
                 
-                file_hash = calculate_file_hash(filepath)
-                file_mtime = get_file_mtime(filepath)
-                processed_at = datetime.now().isoformat()
-                
-                cursor.execute('''
-                INSERT OR REPLACE INTO photos (
-                    filename, filepath, datetime, camera_model, lens_model,
-                    iso, fnumber, exposure_time, focal_length,
-                    orientation, gps_lat, gps_lon, location,
-                    status, file_hash, file_mtime, processed_at, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    os.path.basename(filepath), filepath, None, None, None,
-                    None, None, None, None,
-                    None, None, None, None,
-                    'failed', file_hash, file_mtime, processed_at, error_msg
+                pending_rows.append((
+                    filename, filepath, *exif_fields,
+                    gps_lat, gps_lon, None,
+                    'processed', file_hash, file_mtime, file_size, processed_at, None,
+                    photo_day(exif_fields[0]), photo_datetime_iso(exif_fields[0])
                 ))
-                error_count += 1
-                if image_count % 500 == 0:
-                    conn.commit()
                 
-                pbar.update(1)
-                pbar.set_postfix({'processed': image_count, 'skipped': skipped_count, 'errors': error_count})
-                    
-        except Exception as e:
-            # Critical error processing file
-            error_msg = f"Processing error: {str(e)}"
-            
-            try:
-                file_hash = calculate_file_hash(filepath)
-                file_mtime = get_file_mtime(filepath)
-                processed_at = datetime.now().isoformat()
-                
-                cursor.execute('''
-                INSERT OR REPLACE INTO photos (
-                    filename, filepath, datetime, camera_model, lens_model,
-                    iso, fnumber, exposure_time, focal_length,
-                    orientation, gps_lat, gps_lon, location,
-                    status, file_hash, file_mtime, processed_at, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    os.path.basename(filepath), filepath, None, None, None,
-                    None, None, None, None,
-                    None, None, None, None,
-                    'failed', file_hash, file_mtime, processed_at, error_msg
+                image_count += 1
+                if filepath not in processed_files:
+                    new_count += 1
+            else:
+                # Corrupted EXIF data or unreadable file - still record the file
+                pending_rows.append((
+                    filename, filepath, *NO_EXIF_FIELDS,
+                    'failed', file_hash, file_mtime, file_size, processed_at, error_msg,
+                    None, None
                 ))
                 error_count += 1
-                if error_count % 500 == 0:
-                    conn.commit()
-            except Exception as db_error:
-                pass  # Could not record error, continue
             
-            pbar.update(1)
-            pbar.set_postfix({'processed': image_count, 'skipped': skipped_count, 'errors': error_count})
+            # Write and commit periodically (every PHOTO_BATCH_SIZE rows) for fault tolerance
+            if len(pending_rows) >= PHOTO_BATCH_SIZE:
+                dropped = write_photo_batch(cursor, conn, pending_rows, pending_locations, known_locations)
+                image_count, error_count = count_dropped_rows(dropped, image_count, error_count)
+                unrecorded_count += len(dropped)
+            
+            # Update progress bar (refreshed every PROGRESS_BATCH_SIZE files)
+            pbar_pending += 1
+            if pbar_pending >= PROGRESS_BATCH_SIZE:
+                pbar_pending = flush_progress(pbar, pbar_pending, image_count, skipped_count, error_count)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=not shutdown_requested, cancel_futures=True)
     
     # Close progress bar
+    flush_progress(pbar, pbar_pending, image_count, skipped_count, error_count)
     pbar.close()
     
-    # Final commit
-    conn.commit()
+    # Final write and commit
+    dropped = write_photo_batch(cursor, conn, pending_rows, pending_locations, known_locations)
+    image_count, error_count = count_dropped_rows(dropped, image_count, error_count)
+    unrecorded_count += len(dropped)
     conn.close()
     
     # Print summary
@@ -589,23 +1122,29 @@ def process_images(image_dir, db_file=DB_FILE, force_reprocess=False, skip_locat
     print(f"  Updated (changed): {updated_count}", flush=True)
     print(f"  Skipped (unchanged): {skipped_count}", flush=True)
     print(f"  Failed: {error_count}", flush=True)
+    if unrecorded_count:
+        print(f"  Not recorded (database write failed): {unrecorded_count}", flush=True)
     print(f"  With GPS data: {gps_count}", flush=True)
-    print(f"  Total in database: {image_count + error_count}", flush=True)
+    print(f"  Total in database: {image_count + error_count - unrecorded_count}", flush=True)
     print("="*60, flush=True)
     print(f"Done! Metadata saved to {db_file}\n", flush=True)
     return True
 
 # Function: Export to CSV
-def export_to_csv(db_file=DB_FILE, output_file=None, group_by_day=False, group_by_location=False):
+def export_to_csv(db_file=DB_FILE, output_file=None, group_by_day=False, group_by_location=False, use_wal=True):
     """Export photo metadata from SQLite database to CSV file"""
     
     if not os.path.exists(db_file):
         print(f"ERROR: Database '{db_file}' does not exist.", flush=True)
         return False
     
-    conn = sqlite3.connect(db_file)
+    # WAL lets the export read while a process run is still writing
+    conn = open_database(db_file, use_wal)
     cursor = conn.cursor()
     
+    # Exports read date_day / datetime_iso, which databases from older versions still need filled
+    migrate_database(cursor)
+    
     # Determine output filename
     if output_file is None:
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -623,42 +1162,30 @@ def export_to_csv(db_file=DB_FILE, output_file=None, group_by_day=False, group_b
         # Group by day and location
         query = '''
         SELECT 
-            DATE(datetime) as day,
+            date_day as day,
             location,
             COUNT(*) as photo_count,
             GROUP_CONCAT(filename, '; ') as filenames
         FROM photos
-        WHERE datetime IS NOT NULL
-        GROUP BY DATE(datetime), location
+        WHERE date_day IS NOT NULL
+        GROUP BY date_day, location
         ORDER BY day DESC, location
         '''
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Day', 'Location', 'Photo Count', 'Filenames'])
-            writer.writerows(rows)
+        header = ['Day', 'Location', 'Photo Count', 'Filenames']
     
     elif group_by_day:
         # Group by day
         query = '''
         SELECT 
-            DATE(datetime) as day,
+            date_day as day,
             COUNT(*) as photo_count,
             GROUP_CONCAT(filename, '; ') as filenames
         FROM photos
-        WHERE datetime IS NOT NULL
-        GROUP BY DATE(datetime)
+        WHERE date_day IS NOT NULL
+        GROUP BY date_day
         ORDER BY day DESC
         '''
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Day', 'Photo Count', 'Filenames'])
-            writer.writerows(rows)
+        header = ['Day', 'Photo Count', 'Filenames']
     
     elif group_by_location:
         # Group by location
@@ -672,20 +1199,12 @@ def export_to_csv(db_file=DB_FILE, output_file=None, group_by_day=False, group_b
         GROUP BY location
         ORDER BY photo_count DESC
         '''
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            writer.writerow(['Location', 'Photo Count', 'Filenames'])
-            writer.writerows(rows)
+        header = ['Location', 'Photo Count', 'Filenames']
     
     else:
         # Export all data
         # Check if status column exists
-        cursor.execute("PRAGMA table_info(photos)")
-        columns = [row[1] for row in cursor.fetchall()]
-        has_status = 'status' in columns
+        has_status = 'status' in get_table_columns(cursor, 'photos')
         
         if has_status:
             query = '''
@@ -694,19 +1213,13 @@ def export_to_csv(db_file=DB_FILE, output_file=None, group_by_day=False, group_b
                 iso, fnumber, exposure_time, focal_length, orientation,
                 gps_lat, gps_lon, location, status, processed_at, error_message
             FROM photos
-            ORDER BY datetime DESC
+            ORDER BY datetime_iso DESC
             '''
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'ID', 'Filename', 'Filepath', 'DateTime', 'Camera Model', 'Lens Model',
-                    'ISO', 'F-Number', 'Exposure Time', 'Focal Length', 'Orientation',
-                    'GPS Latitude', 'GPS Longitude', 'Location', 'Status', 'Processed At', 'Error Message'
-                ])
-                writer.writerows(rows)
+            header = [
+                'ID', 'Filename', 'Filepath', 'DateTime', 'Camera Model', 'Lens Model',
+                'ISO', 'F-Number', 'Exposure Time', 'Focal Length', 'Orientation',
+                'GPS Latitude', 'GPS Longitude', 'Location', 'Status', 'Processed At', 'Error Message'
+            ]
         else:
             query = '''
             SELECT 
@@ -716,17 +1229,22 @@ def export_to_csv(db_file=DB_FILE, output_file=None, group_by_day=False, group_b
             FROM photos
             ORDER BY datetime DESC
             '''
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
-                writer.writerow([
-                    'ID', 'Filename', 'Filepath', 'DateTime', 'Camera Model', 'Lens Model',
-                    'ISO', 'F-Number', 'Exposure Time', 'Focal Length', 'Orientation',
-                    'GPS Latitude', 'GPS Longitude', 'Location'
-                ])
-                writer.writerows(rows)
+            header = [
+                'ID', 'Filename', 'Filepath', 'DateTime', 'Camera Model', 'Lens Model',
+                'ISO', 'F-Number', 'Exposure Time', 'Focal Length', 'Orientation',
+                'GPS Latitude', 'GPS Longitude', 'Location'
+            ]
+    
+    # Stream rows from the cursor in batches so memory stays flat on large libraries
+    cursor.execute(query)
+    with open(output_file, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            writer.writerows(rows)
     
     conn.close()
     print(f"Export complete! Data saved to {output_file}", flush=True)
@@ -751,6 +1269,10 @@ def main():
                        help='Force reprocessing of all files, even if already processed')
     parser.add_argument('--skip-location', action='store_true',
                        help='Skip location lookup for faster processing')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                       help='Number of worker processes for EXIF extraction (default: CPU count)')
+    parser.add_argument('--no-wal', action='store_true',
+                       help='Use a rollback journal instead of WAL (for databases on network filesystems)')
     
     args = parser.parse_args()
     
@@ -774,13 +1296,13 @@ def main():
             args.db = get_db_filename_from_folder(args.folder)
             print(f"Auto-derived database filename: {args.db}", flush=True)
         
-        process_images(args.folder, args.db, args.force_reprocess, args.skip_location)
+        process_images(args.folder, args.db, args.force_reprocess, args.skip_location, args.workers, not args.no_wal)
     
     elif args.command == 'export':
         # For export, use default if not provided
         if args.db is None:
             args.db = DB_FILE
-        export_to_csv(args.db, args.output, args.group_by_day, args.group_by_location)
+        export_to_csv(args.db, args.output, args.group_by_day, args.group_by_location, not args.no_wal)
 
 if __name__ == '__main__':
     main()
@@ -7,157 +7,308 @@ Groups photos by day and location, allows navigation through chronological path
 import os
 import sqlite3
 import sys
-from datetime import datetime
-from flask import Flask, render_template_string, send_from_directory, jsonify, abort, request
-import glob
+import threading
+from functools import lru_cache
+from flask import Flask, Response, send_from_directory, jsonify, abort, request
+import hashlib
 import json
+import logging
+import tempfile
+
+# Try to import orjson for faster API responses, fallback to Flask's JSON provider
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Try to import Flask-Compress to gzip API responses (the /api/bundle payload compresses well)
+try:
+    from flask_compress import Compress
+    HAS_COMPRESS = True
+except ImportError:
+    HAS_COMPRESS = False
+
+# Try to import waitress to serve with a production WSGI server, fallback to Flask's server
+try:
+    from waitress import serve
+    HAS_WAITRESS = True
+except ImportError:
+    HAS_WAITRESS = False
+
+# Try to import Pillow for gallery thumbnails, fallback to serving the originals
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
 
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
+if HAS_COMPRESS:
+    Compress(app)
 
 # Configuration
 PHOTOS_BASE_PATH = '/Volumes/E1999/photos_backup'
 
-def parse_datetime(dt_string):
-    """Parse datetime string from database"""
-    if not dt_string:
-        return None
-    try:
-        for fmt in ['%Y:%m:%d %H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d']:
-            try:
-                return datetime.strptime(dt_string, fmt)
-            except ValueError:
-                continue
-        return None
-    except Exception:
-        return None
+# Worker threads for waitress (a gallery page requests many thumbnails at once)
+SERVER_THREADS = 16
+
+# Browser cache lifetime for served photos (one year; originals don't change under a filename)
+PHOTO_MAX_AGE = 31536000
+
+# Photos per /api/photos page (the gallery loads more as it scrolls) and the largest page allowed
+PHOTOS_PAGE_SIZE = 50
+MAX_PHOTOS_PAGE_SIZE = 500
+
+# Gallery thumbnails: longest side in pixels, JPEG quality, and where they are cached
+THUMBNAIL_SIZE = 512
+THUMBNAIL_QUALITY = 82
+THUMBNAIL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnails')
+
+# Case-folded filename -> full path, filled once by init_photo_index()
+PHOTO_INDEX = {}
+
+# Columns of each location/day group returned by /api/locations and /api/bundle
+LOCATION_FIELDS = ('date', 'location', 'lat', 'lon', 'photo_count', 'first_photo_datetime',
+                   'cover_file', 'cover_id')
+
+# Columns of each photo returned by /api/photos and /api/bundle
+PHOTO_FIELDS = ('id', 'filename', 'filepath', 'datetime', 'location',
+                'camera_model', 'lens_model', 'iso', 'fnumber',
+                'exposure_time', 'focal_length', 'gps_lat', 'gps_lon')
+
+# Location/day groups, oldest first.
+# date_day and datetime_iso are the EXIF datetime already normalized to YYYY-MM-DD at ingest.
+# The range also excludes NULL days and the "0000:00:00" placeholder some cameras write,
+# and 1999 (the default clock of cameras that were never set) is skipped.
+# With a single MIN() aggregate, SQLite takes the bare columns (gps_lat, gps_lon, filename, id)
+# from the row holding the minimum, so the cover photo is the group's first photo without a
+# second query (https://www.sqlite.org/lang_select.html#bare_columns_in_an_aggregate_query).
+LOCATIONS_BY_DAY_SQL = '''
+SELECT 
+    date_day as date,
+    location,
+    gps_lat as lat,
+    gps_lon as lon,
+    COUNT(*) as photo_count,
+    MIN(datetime_iso) as first_photo_datetime,
+    filename as cover_file,
+    id as cover_id
+FROM photos
+WHERE date_day >= '0001-01-01'
+  AND location IS NOT NULL
+  AND gps_lat IS NOT NULL
+  AND gps_lon IS NOT NULL
+  AND status = 'processed'
+  AND date_day NOT LIKE '1999%'
+GROUP BY date_day, location
+ORDER BY first_photo_datetime ASC
+'''
+
+# One page of a location/day's photos (date_day = ? makes the lookup an index seek)
+PHOTOS_FOR_LOCATION_DAY_SQL = f'''
+SELECT {', '.join(PHOTO_FIELDS)}
+FROM photos
+WHERE date_day = ?
+  AND location = ?
+  AND status = 'processed'
+  AND date_day NOT LIKE '1999%'
+ORDER BY datetime_iso ASC, id ASC
+LIMIT ? OFFSET ?
+'''
+
+# Every location/day's photos, each row prefixed with its "date|location" key
+PHOTO_BUNDLE_SQL = f'''
+SELECT date_day || '|' || location, {', '.join(PHOTO_FIELDS)}
+FROM photos
+WHERE date_day >= '0001-01-01'
+  AND location IS NOT NULL
+  AND status = 'processed'
+  AND date_day NOT LIKE '1999%'
+ORDER BY datetime_iso ASC, id ASC
+'''
+
+# Prepared statements kept per connection (the queries above plus headroom)
+STATEMENT_CACHE_SIZE = 64
+
+# Read connection per server thread (see get_db)
+_db_local = threading.local()
+
+def init_photo_index():
+    """
+    Walk PHOTOS_BASE_PATH once and index every file by case-folded filename,
+    so photo requests are a dict lookup instead of a recursive glob.
+    Returns the number of indexed files.
+    """
+    index = {}
+    for root, _, files in os.walk(PHOTOS_BASE_PATH):
+        for name in files:
+            index.setdefault(name.casefold(), os.path.join(root, name))
+    PHOTO_INDEX.clear()
+    PHOTO_INDEX.update(index)
+    return len(index)
 
 def find_photo_path(photo_filename):
     """Find the full path to a photo file in the photos_backup directory"""
     if not photo_filename:
         return None
     
-    search_patterns = [
-        os.path.join(PHOTOS_BASE_PATH, '**', photo_filename),
-        os.path.join(PHOTOS_BASE_PATH, '**', photo_filename.upper()),
-        os.path.join(PHOTOS_BASE_PATH, '**', photo_filename.lower()),
-    ]
-    
-    for pattern in search_patterns:
-        matches = glob.glob(pattern, recursive=True)
-        if matches:
-            return matches[0]
+    # Build the index on first use if it wasn't built at startup (e.g. the volume was mounted later)
+    if not PHOTO_INDEX:
+        init_photo_index()
+    return PHOTO_INDEX.get(photo_filename.casefold())
+
+def get_thumbnail(photo_path):
+    """
+    Return the path of a cached JPEG thumbnail for photo_path, generating it on first use
+    (and again if the original is newer). Returns None if Pillow can't read the photo.
+    """
+    thumb_name = hashlib.sha1(photo_path.encode('utf-8')).hexdigest() + '.jpg'
+    thumb_path = os.path.join(THUMBNAIL_DIR, thumb_name)
+    try:
+        if os.path.getmtime(thumb_path) >= os.path.getmtime(photo_path):
+            return thumb_path
+    except OSError:
+        pass  # No thumbnail yet
     
-    return None
+    try:
+        with Image.open(photo_path) as img:
+            img.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))  # Let the JPEG decoder downscale
+            img = ImageOps.exif_transpose(img)  # Bake in the orientation the browser would apply
+            img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS)
+            os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+            # Write to a temp file first so concurrent requests never see a partial thumbnail
+            fd, tmp_path = tempfile.mkstemp(suffix='.jpg', dir=THUMBNAIL_DIR)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    img.convert('RGB').save(f, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
+                os.replace(tmp_path, thumb_path)
+            except BaseException:
+                # Don't leave the partial temp file behind in THUMBNAIL_DIR
+                os.unlink(tmp_path)
+                raise
+        return thumb_path
+    except Exception as e:
+        print(f"WARNING: Could not create thumbnail for {photo_path}: {e}", flush=True)
+        return None
 
-def get_locations_by_day(db_file):
+def ensure_indexes(db_file):
     """
-    Get all unique location/day combinations, sorted chronologically.
-    Returns list of dicts with: date, location, lat, lon, photo_count, first_photo_datetime
+    Create the index behind the map queries (safe to run on every start).
+    app.py stores each photo's calendar day (date_day) and normalized datetime (datetime_iso)
+    at ingest; databases written before those columns existed are upgraded with app.py's
+    migrate_database, which owns the backfill.
+    The index carries every column the locations query reads, so that query never touches
+    the table, and is ordered by datetime_iso within a day/location for the photos query.
+    Returns False if the database could not be upgraded.
     """
     conn = sqlite3.connect(db_file)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Query: Group by date (day) and location, get first photo datetime and count
-    # Handle datetime format: could be "2008:09:12 14:30:00" or "2008-09-12 14:30:00"
-    # Extract date part by taking first 10 characters after replacing colons with dashes
-    query = '''
-    SELECT 
-        SUBSTR(REPLACE(datetime, ':', '-'), 1, 10) as date,
-        location,
-        gps_lat,
-        gps_lon,
-        COUNT(*) as photo_count,
-        MIN(datetime) as first_photo_datetime
-    FROM photos
-    WHERE datetime IS NOT NULL 
-      AND location IS NOT NULL
-      AND gps_lat IS NOT NULL
-      AND gps_lon IS NOT NULL
-      AND status = 'processed'
-      AND datetime NOT LIKE '1999%'
-    GROUP BY SUBSTR(REPLACE(datetime, ':', '-'), 1, 10), location
-    HAVING COUNT(*) > 0
-    ORDER BY first_photo_datetime ASC
-    '''
-    
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    
-    locations = []
-    for row in rows:
-        dt = parse_datetime(row['first_photo_datetime'])
-        if not dt or dt.year == 1999:
-            continue
-        
-        # Normalize date format to YYYY-MM-DD
-        date_str = row['date']
-        if ':' in date_str:
-            date_str = date_str.replace(':', '-')
-        if len(date_str) > 10:
-            date_str = date_str[:10]
-        
-        locations.append({
-            'date': date_str,
-            'location': row['location'],
-            'lat': row['gps_lat'],
-            'lon': row['gps_lon'],
-            'photo_count': row['photo_count'],
-            'first_photo_datetime': row['first_photo_datetime'],
-            'date_obj': dt
-        })
-    
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(photos)")}
+    if not {'date_day', 'datetime_iso'} <= columns:
+        try:
+            from app import migrate_database
+        except ImportError as e:
+            print(f"ERROR: Database '{db_file}' predates the date_day/datetime_iso columns and app.py "
+                  f"could not be loaded to migrate it ({e}). Run app.py process on it first.", flush=True)
+            conn.close()
+            return False
+        print("Migrating database schema...", flush=True)
+        migrate_database(conn.cursor())
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_photos_map_groups
+    ON photos(date_day, location, datetime_iso, gps_lat, gps_lon, status, filename)
+    WHERE status = 'processed'
+    ''')
+    conn.commit()
     conn.close()
-    return locations
+    return True
 
-def get_photos_for_location_day(db_file, location, date):
+def get_db(db_file):
     """
-    Get all photos for a specific location and date.
+    Return the calling thread's connection to db_file, opening it on first use.
+    Server threads are long-lived, so each keeps its connection (and SQLite's page cache,
+    parsed schema and prepared statements for the *_SQL constants below) warm between
+    requests, and threads read in parallel without a lock (WAL readers don't block each other).
+    """
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None or _db_local.db_file != db_file:
+        if conn is not None:
+            conn.close()
+        conn = sqlite3.connect(db_file, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA cache_size=-65536')  # 64 MB
+        conn.execute('PRAGMA mmap_size=268435456')  # 256 MB
+        conn.execute('PRAGMA temp_store=MEMORY')
+        _db_local.conn = conn
+        _db_local.db_file = db_file
+    return conn
+
+def get_locations_by_day(conn):
+    """
+    Get all unique location/day combinations, sorted chronologically.
+    Returns a columnar table {'cols': LOCATION_FIELDS, 'rows': [[...], ...]} (field names
+    sent once instead of per location) with: date, location, lat, lon, photo_count,
+    first_photo_datetime, cover_file, cover_id
+    """
+    return {'cols': LOCATION_FIELDS, 'rows': conn.execute(LOCATIONS_BY_DAY_SQL).fetchall()}
+
+def get_photos_for_location_day(conn, location, date, offset=0, limit=PHOTOS_PAGE_SIZE):
+    """
+    Get one page of photos for a specific location and date.
     Returns list of photo dicts with metadata.
     """
-    conn = sqlite3.connect(db_file)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    # Handle datetime format: could be "2008:09:12 14:30:00" or "2008-09-12 14:30:00"
-    # Match by extracting date part and comparing
-    query = '''
-    SELECT 
-        id, filename, filepath, datetime, location,
-        camera_model, lens_model, iso, fnumber, 
-        exposure_time, focal_length, gps_lat, gps_lon
-    FROM photos
-    WHERE SUBSTR(REPLACE(datetime, ':', '-'), 1, 10) = ?
-      AND location = ?
-      AND status = 'processed'
-      AND datetime NOT LIKE '1999%'
-    ORDER BY datetime ASC
-    '''
-    
-    cursor.execute(query, (date, location))
-    rows = cursor.fetchall()
-    
-    photos = []
-    for row in rows:
-        photo = {
-            'id': row['id'],
-            'filename': row['filename'],
-            'filepath': row['filepath'],
-            'datetime': row['datetime'],
-            'location': row['location'],
-            'camera_model': row['camera_model'],
-            'lens_model': row['lens_model'],
-            'iso': row['iso'],
-            'fnumber': row['fnumber'],
-            'exposure_time': row['exposure_time'],
-            'focal_length': row['focal_length'],
-            'gps_lat': row['gps_lat'],
-            'gps_lon': row['gps_lon']
-        }
-        photos.append(photo)
+    cursor = conn.execute(PHOTOS_FOR_LOCATION_DAY_SQL, (date, location, limit, offset))
+    return [dict(zip(PHOTO_FIELDS, row)) for row in cursor]
+
+def get_photo_bundle(conn):
+    """
+    Get every location/day group and all of their photos in one pass.
+    Returns {'locations': {'cols': [...], 'rows': [...]}, 'photos_by_key': {"YYYY-MM-DD|location": [photo dicts]}},
+    with the same payloads /api/locations and /api/photos return.
+    """
+    photos_by_key = {}
+    for row in conn.execute(PHOTO_BUNDLE_SQL):
+        photos_by_key.setdefault(row[0], []).append(dict(zip(PHOTO_FIELDS, row[1:])))
     
-    conn.close()
-    return photos
+    return {'locations': get_locations_by_day(conn), 'photos_by_key': photos_by_key}
+
+def db_version(db_file):
+    """
+    Modification times of the database and its WAL file.
+    Ingest writes land in the -wal file until a checkpoint, so both are needed
+    to notice new data.
+    """
+    version = []
+    for path in (db_file, db_file + '-wal'):
+        try:
+            version.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            version.append(None)
+    return tuple(version)
+
+def dump_json(obj):
+    """Serialize an API payload to JSON bytes (orjson when available)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj)
+    return app.json.dumps(obj).encode('utf-8')
+
+@lru_cache(maxsize=4)
+def locations_json(db_file, version):
+    """Serialized /api/locations body; cached until db_version() changes"""
+    locations = get_locations_by_day(get_db(db_file))
+    return dump_json(locations)
+
+@lru_cache(maxsize=4)
+def bundle_json(db_file, version):
+    """Serialized /api/bundle body; cached until db_version() changes"""
+    bundle = get_photo_bundle(get_db(db_file))
+    return dump_json(bundle)
+
+@lru_cache(maxsize=256)
+def photos_json(db_file, location, date, offset, limit, version):
+    """Serialized /api/photos page and its photo count; cached until db_version() changes"""
+    photos = get_photos_for_location_day(get_db(db_file), location, date, offset, limit)
+    return dump_json(photos), len(photos)
 
 # HTML Template
 MAP_TEMPLATE = """
@@ -380,6 +531,12 @@ MAP_TEMPLATE = """
         let map;
         let currentMarker;
         let pathPolyline;
+        const PHOTOS_PAGE_SIZE = 50;
+        let photoQuery = null;  // Location/day whose photos the gallery is showing, and paging state
+        let photoObserver = null;
+        let photosByKey = null;  // "date|location" -> photos, from /api/bundle
+        const DT_RE = /(\\d{4})[:\\/-](\\d{2})[:\\/-](\\d{2})\\s+(\\d{2}):(\\d{2}):(\\d{2})/;
+        const parsedDates = new Map();  // Raw datetime string -> parsed Date (or null), reused while scrubbing
 
         // Initialize map
         function initMap() {
@@ -391,11 +548,23 @@ MAP_TEMPLATE = """
             }).addTo(map);
         }
 
+        // Expand a columnar {cols, rows} table into one object per row
+        function fromColumns(table) {
+            return table.rows.map(row => {
+                const record = {};
+                table.cols.forEach((col, i) => { record[col] = row[i]; });
+                return record;
+            });
+        }
+
         // Load locations from API
         async function loadLocations() {
             try {
-                const response = await fetch('/api/locations');
-                locations = await response.json();
+                // One request for every location and its photos; navigation then never waits on the server
+                const response = await fetch('/api/bundle');
+                const bundle = await response.json();
+                locations = fromColumns(bundle.locations);
+                photosByKey = bundle.photos_by_key;
                 
                 if (locations.length === 0) {
                     document.getElementById('location-info').textContent = 'No locations found';
@@ -437,6 +606,7 @@ MAP_TEMPLATE = """
         // Parse datetime string to Date object
         function parseDateTime(dtString) {
             if (!dtString) return null;
+            if (parsedDates.has(dtString)) return parsedDates.get(dtString);
             
             // Handle EXIF format: "2008:09:12 14:30:00"
             // Replace first two colons (date part) with dashes, keep space and time
@@ -461,8 +631,7 @@ MAP_TEMPLATE = """
             let date = new Date(normalized);
             if (isNaN(date.getTime())) {
                 // Fallback: try manual parsing for "YYYY:MM:DD HH:MM:SS"
-                const regexPattern = '(\\d{4})[:/-](\\d{2})[:/-](\\d{2})\\s+(\\d{2}):(\\d{2}):(\\d{2})';
-                const match = dtString.match(new RegExp(regexPattern));
+                const match = dtString.match(DT_RE);
                 if (match) {
                     const [, year, month, day, hour, minute, second] = match;
                     date = new Date(parseInt(year), parseInt(month) - 1, parseInt(day), 
@@ -473,7 +642,9 @@ MAP_TEMPLATE = """
                 }
             }
             
-            return isNaN(date.getTime()) ? null : date;
+            const result = isNaN(date.getTime()) ? null : date;
+            parsedDates.set(dtString, result);
+            return result;
         }
 
         // Load location and photos
@@ -529,80 +700,140 @@ MAP_TEMPLATE = """
                     iconSize: [20, 20],
                     iconAnchor: [10, 10]
                 })
-            }).addTo(map);
+            }).bindPopup(`<img src="/thumb/${encodeURIComponent(location.cover_file)}" alt="${location.cover_file}" width="160" loading="lazy">`)
+              .addTo(map);
             
             // Load photos
             await loadPhotos(location.location, location.date);
         }
 
         // Load photos for current location/day
+        // Build the gallery card for one photo
+        function renderPhoto(photo) {
+            const photoDate = parseDateTime(photo.datetime);
+            let dateStr = 'Unknown date';
+            if (photoDate) {
+                dateStr = photoDate.toLocaleString('en-US', {
+                    year: 'numeric',
+                    month: 'short',
+                    day: 'numeric',
+                    hour: '2-digit',
+                    minute: '2-digit'
+                });
+            }
+            
+            let metaHTML = `<strong>Date:</strong> ${dateStr}<br>`;
+            if (photo.camera_model) {
+                metaHTML += `<strong>Camera:</strong> ${photo.camera_model}<br>`;
+            }
+            if (photo.lens_model) {
+                metaHTML += `<strong>Lens:</strong> ${photo.lens_model}<br>`;
+            }
+            if (photo.iso) {
+                metaHTML += `<strong>ISO:</strong> ${photo.iso}`;
+            }
+            if (photo.fnumber) {
+                metaHTML += ` | <strong>f/</strong>${photo.fnumber}`;
+            }
+            if (photo.exposure_time) {
+                metaHTML += ` | <strong>Exposure:</strong> ${photo.exposure_time}s`;
+            }
+            if (photo.focal_length) {
+                metaHTML += ` | <strong>Focal:</strong> ${photo.focal_length}mm`;
+            }
+            
+            return `
+                <div class="photo-item">
+                    <a href="/photo/${encodeURIComponent(photo.filename)}" target="_blank">
+                    <img src="/thumb/${encodeURIComponent(photo.filename)}" 
+                         alt="${photo.filename}" 
+                         loading="lazy" decoding="async"
+                         onerror="this.src='data:image/svg+xml,%3Csvg xmlns=\\'http://www.w3.org/2000/svg\\' width=\\'400\\' height=\\'300\\'%3E%3Crect fill=\\'%23ddd\\' width=\\'400\\' height=\\'300\\'/%3E%3Ctext x=\\'50%25\\' y=\\'50%25\\' text-anchor=\\'middle\\' dy=\\'.3em\\' fill=\\'%23999\\'%3EPhoto not found%3C/text%3E%3C/svg%3E';">
+                    </a>
+                    <div class="photo-details">
+                        <h3>${photo.filename}</h3>
+                        <div class="photo-meta">${metaHTML}</div>
+                    </div>
+                </div>
+            `;
+        }
+
+        // Load the first page of photos for a location/day; later pages load on scroll
         async function loadPhotos(location, date) {
+            if (photoObserver) {
+                photoObserver.disconnect();
+            }
             document.getElementById('photo-gallery').innerHTML = '<div class="loading">Loading photos...</div>';
+            photoQuery = {location: location, date: date, offset: 0, done: false, loading: false};
+            await loadMorePhotos();
+        }
+
+        // Next page of photos for a gallery query, from the bundle when it was loaded
+        async function fetchPhotoPage(query) {
+            if (photosByKey) {
+                const photos = photosByKey[`${query.date}|${query.location}`] || [];
+                return photos.slice(query.offset, query.offset + PHOTOS_PAGE_SIZE);
+            }
+            const response = await fetch(`/api/photos?location=${encodeURIComponent(query.location)}&date=${encodeURIComponent(query.date)}&offset=${query.offset}&limit=${PHOTOS_PAGE_SIZE}`);
+            return await response.json();
+        }
+
+        // Fetch the next page of photos and append it to the gallery
+        async function loadMorePhotos() {
+            const query = photoQuery;
+            if (!query || query.done || query.loading) {
+                return;
+            }
+            query.loading = true;
+            const gallery = document.getElementById('photo-gallery');
             
             try {
-                const response = await fetch(`/api/photos?location=${encodeURIComponent(location)}&date=${encodeURIComponent(date)}`);
-                const photos = await response.json();
+                const photos = await fetchPhotoPage(query);
                 
-                if (photos.length === 0) {
-                    document.getElementById('photo-gallery').innerHTML = '<div class="loading">No photos found for this location</div>';
+                // The user moved to another location while this page was loading
+                if (query !== photoQuery) {
                     return;
                 }
                 
-                let galleryHTML = '';
-                photos.forEach(photo => {
-                    const photoDate = parseDateTime(photo.datetime);
-                    let dateStr = 'Unknown date';
-                    if (photoDate) {
-                        dateStr = photoDate.toLocaleString('en-US', {
-                            year: 'numeric',
-                            month: 'short',
-                            day: 'numeric',
-                            hour: '2-digit',
-                            minute: '2-digit'
-                        });
-                    }
-                    
-                    let metaHTML = `<strong>Date:</strong> ${dateStr}<br>`;
-                    if (photo.camera_model) {
-                        metaHTML += `<strong>Camera:</strong> ${photo.camera_model}<br>`;
-                    }
-                    if (photo.lens_model) {
-                        metaHTML += `<strong>Lens:</strong> ${photo.lens_model}<br>`;
-                    }
-                    if (photo.iso) {
-                        metaHTML += `<strong>ISO:</strong> ${photo.iso}`;
+                if (query.offset === 0) {
+                    if (photos.length === 0) {
+                        gallery.innerHTML = '<div class="loading">No photos found for this location</div>';
+                        query.done = true;
+                        return;
                     }
-                    if (photo.fnumber) {
-                        metaHTML += ` | <strong>f/</strong>${photo.fnumber}`;
-                    }
-                    if (photo.exposure_time) {
-                        metaHTML += ` | <strong>Exposure:</strong> ${photo.exposure_time}s`;
-                    }
-                    if (photo.focal_length) {
-                        metaHTML += ` | <strong>Focal:</strong> ${photo.focal_length}mm`;
-                    }
-                    
-                    galleryHTML += `
-                        <div class="photo-item">
-                            <img src="/photo/${encodeURIComponent(photo.filename)}" 
-                                 alt="${photo.filename}" 
-                                 onerror="this.src='data:image/svg+xml,%3Csvg xmlns=\\'http://www.w3.org/2000/svg\\' width=\\'400\\' height=\\'300\\'%3E%3Crect fill=\\'%23ddd\\' width=\\'400\\' height=\\'300\\'/%3E%3Ctext x=\\'50%25\\' y=\\'50%25\\' text-anchor=\\'middle\\' dy=\\'.3em\\' fill=\\'%23999\\'%3EPhoto not found%3C/text%3E%3C/svg%3E';">
-                            <div class="photo-details">
-                                <h3>${photo.filename}</h3>
-                                <div class="photo-meta">${metaHTML}</div>
-                            </div>
-                        </div>
-                    `;
-                });
+                    gallery.innerHTML = '';
+                }
                 
-                document.getElementById('photo-gallery').innerHTML = galleryHTML;
+                gallery.insertAdjacentHTML('beforeend', photos.map(renderPhoto).join(''));
+                query.offset += photos.length;
+                query.done = photos.length < PHOTOS_PAGE_SIZE;
+                if (!query.done) {
+                    observeLastPhoto(gallery);
+                }
             } catch (error) {
                 console.error('Error loading photos:', error);
-                document.getElementById('photo-gallery').innerHTML = 
-                    '<div class="loading">Error loading photos</div>';
+                if (query.offset === 0) {
+                    gallery.innerHTML = '<div class="loading">Error loading photos</div>';
+                }
+            } finally {
+                query.loading = false;
             }
         }
 
+        // Load the next page once the last photo scrolls near the bottom of the gallery
+        function observeLastPhoto(gallery) {
+            if (!photoObserver) {
+                photoObserver = new IntersectionObserver(entries => {
+                    if (entries.some(entry => entry.isIntersecting)) {
+                        photoObserver.disconnect();
+                        loadMorePhotos();
+                    }
+                }, {root: gallery, rootMargin: '600px'});
+            }
+            photoObserver.disconnect();
+            photoObserver.observe(gallery.lastElementChild);
+        }
+
         // Navigate to next/previous location
         function navigateLocation(direction) {
             const newIndex = currentIndex + direction;
@@ -730,10 +961,19 @@ MAP_TEMPLATE = """
 </html>
 """
 
+# The page has no template variables, so encode it once instead of running Jinja per request
+MAP_PAGE = MAP_TEMPLATE.encode('utf-8')
+MAP_PAGE_ETAG = hashlib.sha1(MAP_PAGE).hexdigest()
+MAP_PAGE_MAX_AGE = 300
+
 @app.route('/')
 def index():
     """Main map storyteller page"""
-    return render_template_string(MAP_TEMPLATE)
+    response = Response(MAP_PAGE, mimetype='text/html')
+    response.cache_control.public = True
+    response.cache_control.max_age = MAP_PAGE_MAX_AGE
+    response.set_etag(MAP_PAGE_ETAG)
+    return response.make_conditional(request)
 
 @app.route('/api/locations')
 def api_locations():
@@ -745,14 +985,29 @@ def api_locations():
     if not os.path.exists(db_file):
         return jsonify({'error': 'Database file not found'}), 404
     
-    locations = get_locations_by_day(db_file)
-    return jsonify(locations)
+    body = locations_json(db_file, db_version(db_file))
+    return Response(body, mimetype='application/json')
+
+@app.route('/api/bundle')
+def api_bundle():
+    """API endpoint: Get all locations by day plus every location/day's photos in one response"""
+    db_file = app.config.get('DB_FILE')
+    if not db_file:
+        return jsonify({'error': 'Database not configured'}), 500
+    
+    if not os.path.exists(db_file):
+        return jsonify({'error': 'Database file not found'}), 404
+    
+    body = bundle_json(db_file, db_version(db_file))
+    return Response(body, mimetype='application/json')
 
 @app.route('/api/photos')
 def api_photos():
     """API endpoint: Get photos for a specific location and date"""
     location = request.args.get('location')
     date = request.args.get('date')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', PHOTOS_PAGE_SIZE, type=int), 1), MAX_PHOTOS_PAGE_SIZE)
     
     if not location or not date:
         return jsonify({'error': 'Location and date required'}), 400
@@ -764,12 +1019,12 @@ def api_photos():
     if not os.path.exists(db_file):
         return jsonify({'error': 'Database file not found'}), 404
     
-    photos = get_photos_for_location_day(db_file, location, date)
+    body, photo_count = photos_json(db_file, location, date, offset, limit, db_version(db_file))
     
-    # Debug: log the query parameters and results
-    print(f"DEBUG: Querying photos for location='{location}', date='{date}', found {len(photos)} photos", flush=True)
+    # Debug: log the query parameters and results (only emitted when DEBUG logging is enabled)
+    logger.debug("Querying photos for location=%r, date=%r, offset=%d: found %d photos", location, date, offset, photo_count)
     
-    return jsonify(photos)
+    return Response(body, mimetype='application/json')
 
 @app.route('/photo/<photo_filename>')
 def serve_photo(photo_filename):
@@ -782,7 +1037,26 @@ def serve_photo(photo_filename):
     directory = os.path.dirname(photo_path)
     filename = os.path.basename(photo_path)
     
-    return send_from_directory(directory, filename)
+    # Conditional GET (ETag/Last-Modified) plus a long-lived cache, so revisits are 304s or cache hits
+    response = send_from_directory(directory, filename, conditional=True, max_age=PHOTO_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/thumb/<photo_filename>')
+def serve_thumbnail(photo_filename):
+    """Serve a gallery-sized thumbnail (the original photo if Pillow is unavailable)"""
+    photo_path = find_photo_path(photo_filename)
+    
+    if not photo_path or not os.path.exists(photo_path):
+        abort(404)
+    
+    thumb_path = get_thumbnail(photo_path) if HAS_PIL else None
+    if thumb_path is None:
+        return serve_photo(photo_filename)
+    
+    response = send_from_directory(THUMBNAIL_DIR, os.path.basename(thumb_path), conditional=True, max_age=PHOTO_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
 
 if __name__ == '__main__':
     import argparse
@@ -797,8 +1071,11 @@ if __name__ == '__main__':
                        help='Host to bind to (default: 127.0.0.1)')
     parser.add_argument('--port', type=int, default=5001,
                        help='Port to bind to (default: 5001)')
+    parser.add_argument('--debug', action='store_true',
+                       help="Run Flask's debug server (auto-reload, debugger) instead of waitress")
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
     
     if not os.path.exists(args.db):
         print(f"ERROR: Database '{args.db}' does not exist.", flush=True)
@@ -806,12 +1083,17 @@ if __name__ == '__main__':
     
     # Configure app
     app.config['DB_FILE'] = args.db
+    if not ensure_indexes(args.db):
+        sys.exit(1)
     PHOTOS_BASE_PATH = args.photos_path
     
     # Check if photos directory exists
     if not os.path.exists(PHOTOS_BASE_PATH):
         print(f"WARNING: Photos directory not found: {PHOTOS_BASE_PATH}")
         print("Image previews will not work until the directory is available.")
+    else:
+        print(f"Indexing photos in {PHOTOS_BASE_PATH}...", flush=True)
+        print(f"Indexed {init_photo_index():,} files", flush=True)
     
     print("="*60, flush=True)
     print("Map Storyteller - Photo Journey", flush=True)
@@ -821,5 +1103,10 @@ if __name__ == '__main__':
     print(f"\nOpen your browser to: http://{args.host}:{args.port}", flush=True)
     print("="*60, flush=True)
     
-    app.run(debug=True, host=args.host, port=args.port)
+    if args.debug:
+        app.run(debug=True, host=args.host, port=args.port)
+    elif HAS_WAITRESS:
+        serve(app, host=args.host, port=args.port, threads=SERVER_THREADS)
+    else:
+        app.run(host=args.host, port=args.port, threaded=True)
 
@@ -8,26 +8,149 @@ with image vision capabilities. Writes individual markdown files per segment.
 import os
 import sqlite3
 import argparse
+import asyncio
+import collections
 import json
-import base64
+import hashlib
+import io
+import mmap
 import random
+import re
+import tempfile
 from datetime import datetime
-from collections import defaultdict
 from typing import List, Dict, Tuple, Optional
 import sys
 
-# Try to import OpenAI (or compatible API)
+# Try to import aiohttp to call the chat completions endpoint directly (pooled keep-alive connections)
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+# Try to import OpenAI (or compatible API), used when aiohttp isn't installed
 try:
     import openai
     HAS_OPENAI = True
 except ImportError:
     HAS_OPENAI = False
-    print("WARNING: openai library not found. Install with: pip install openai")
-    sys.exit(1)
+
+# Try to import aiolimiter to cap the request rate (--rpm)
+try:
+    from aiolimiter import AsyncLimiter
+    HAS_AIOLIMITER = True
+except ImportError:
+    HAS_AIOLIMITER = False
+
+# Try to import pybase64 (SIMD-accelerated), fallback to the standard library encoder
+try:
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+
+# Try to import Pillow to downscale photos before they're sent to the vision model
+try:
+    from PIL import Image, ImageOps
+    HAS_PIL = True
+except ImportError:
+    HAS_PIL = False
 
 # LMStudio endpoint
 LMSTUDIO_BASE_URL = "http://192.168.1.220:1234/v1"
 
+# Story segments requested from the LLM at the same time
+DEFAULT_CONCURRENCY = 8
+
+# Longest edge (pixels) of images sent to the vision model; larger photos are downscaled (0 = send originals)
+DEFAULT_IMAGE_MAX_EDGE = 1024
+IMAGE_JPEG_QUALITY = 85
+
+# Base64-encoded images from earlier runs, keyed by path, mtime, size and max edge
+IMAGE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'exifstoryteller')
+
+# System prompt shared by every story request
+SYSTEM_PROMPT = "You are a writer creating a personal life story narrative from actual photo data. You will be given structured data logs showing dates, locations, photo counts, and EXIF data. Write about the ACTUAL data provided - do not make up events, locations, or details that are not in the data. Reference the image when relevant. Keep it natural and flowing, but stay grounded in the facts provided."
+SYSTEM_MESSAGE = {"role": "system", "content": SYSTEM_PROMPT}
+
+# Seconds to wait for a single completion (the OpenAI client's default)
+REQUEST_TIMEOUT = 600
+
+# Attempts per completion on transient errors (connection failures, timeouts, 429/5xx),
+# backing off a random 0..min(RETRY_MAX_WAIT, RETRY_BASE_WAIT * 2^attempt) seconds in between
+MAX_REQUEST_ATTEMPTS = 5
+RETRY_BASE_WAIT = 1
+RETRY_MAX_WAIT = 30
+
+# LLM replies from earlier runs, keyed by a hash of the full request (model, prompt and images)
+STORY_CACHE_FILE = '.story_cache.db'
+
+# Shared AsyncLimiter for the current run (None = no rate limit), set by generate_all_segments
+_rate_limiter = None
+
+# Connection to STORY_CACHE_FILE for the current run (None = --no-cache), set by generate_all_segments
+_response_cache = None
+
+# Month key for a photo ('YYYY-MM'); app.py has written both 'YYYY:MM:DD' and 'YYYY-MM-DD' datetimes
+PHOTO_MONTH_SQL = "REPLACE(SUBSTR(datetime, 1, 7), ':', '-')"
+
+# Photo datetime with a dash-separated date, so MIN() compares both formats chronologically
+PHOTO_DATETIME_ISO_SQL = "REPLACE(SUBSTR(datetime, 1, 10), ':', '-') || SUBSTR(datetime, 11)"
+
+# Photos that can be grouped into a location/month segment
+# (erroneous 1999 camera dates are skipped, as are datetimes without a 'YYYY-MM' prefix)
+CHUNK_PHOTOS_WHERE = '''
+    datetime GLOB '[0-9][0-9][0-9][0-9][:-][0-9][0-9]*'
+      AND location IS NOT NULL
+      AND status = 'processed'
+      AND datetime NOT LIKE '1999%'
+'''
+
+# JPG/PNG photos, the only formats the vision model can read (see is_image_readable)
+READABLE_PHOTO_SQL = "(filepath LIKE '%.jpg' OR filepath LIKE '%.jpeg' OR filepath LIKE '%.png')"
+
+# One row per location/month with its photo count, first datetime and distinct cameras/lenses
+CHUNK_AGGREGATES_SQL = f'''
+    SELECT location, {PHOTO_MONTH_SQL} AS ym, COUNT(*) AS n, MIN({PHOTO_DATETIME_ISO_SQL}) AS first_datetime,
+           json_group_array(DISTINCT camera_model) AS cameras,
+           json_group_array(DISTINCT lens_model) AS lens_models
+    FROM photos
+    WHERE {CHUNK_PHOTOS_WHERE}
+    GROUP BY location, ym
+'''
+
+# One random photo per location/month, preferring readable JPG/PNG files
+# (shuffled by a multiplicative hash of the id rather than RANDOM(), so re-runs pick the same
+# photo and send the same prompt, letting replies come from the response cache)
+CHUNK_SELECTED_PHOTOS_SQL = f'''
+    SELECT id, filename, filepath, datetime, camera_model, lens_model,
+           iso, fnumber, exposure_time, focal_length, gps_lat, gps_lon, location, ym, readable
+    FROM (
+        SELECT *, {PHOTO_MONTH_SQL} AS ym, {READABLE_PHOTO_SQL} AS readable,
+               ROW_NUMBER() OVER (
+                   PARTITION BY location, {PHOTO_MONTH_SQL}
+                   ORDER BY {READABLE_PHOTO_SQL} DESC, (id * 2654435761) % 4294967296
+               ) AS pick
+        FROM photos
+        WHERE {CHUNK_PHOTOS_WHERE}
+    )
+    WHERE pick = 1
+'''
+
+# "Key: value" lines in metadata.md (comment lines start with '#'; key and value are trimmed and non-empty)
+METADATA_LINE_RE = re.compile(r'^[ \t]*([^#\s:][^:\n]*?)[ \t]*:[ \t]*(\S.*?)[ \t]*$', re.MULTILINE)
+
+# EXIF fields shown in a photo's data log line, in order, with their display format (empty values are skipped)
+EXIF_FIELDS = (
+    ('camera_model', "Camera: {}"),
+    ('lens_model', "Lens: {}"),
+    ('iso', "ISO: {}"),
+    ('fnumber', "f/{}"),
+    ('exposure_time', "Exposure: {}s"),
+    ('focal_length', "Focal Length: {}mm"),
+    ('datetime', "Date/Time: {}"),
+)
+GPS_FORMAT = "GPS: {}, {}"  # Appended last, only when both coordinates are set
+
 def parse_datetime(dt_string):
     """Parse datetime string from database"""
     if not dt_string:
@@ -50,16 +173,66 @@ def is_image_readable(filepath: str) -> bool:
     ext = os.path.splitext(filepath)[1].lower()
     return ext in ['.jpg', '.jpeg', '.png']
 
-def encode_image_to_base64(filepath: str) -> Optional[str]:
-    """Encode image file to base64 string"""
+def encode_image_to_base64(filepath: str, max_edge: int = 0) -> Optional[bytes]:
+    """
+    Encode image file to base64 (ASCII bytes).
+    Photos larger than max_edge (when Pillow is available) are downscaled and re-saved in their
+    own format; otherwise the file is memory-mapped and encoded in place, so no copy of the raw
+    image is read into memory.
+    """
     try:
-        with open(filepath, 'rb') as f:
-            image_data = f.read()
-            return base64.b64encode(image_data).decode('utf-8')
+        if max_edge > 0 and HAS_PIL:
+            with Image.open(filepath) as img:
+                if max(img.size) > max_edge:
+                    img_format = img.format
+                    img.draft('RGB', (max_edge, max_edge))  # Let the JPEG decoder downscale
+                    img = ImageOps.exif_transpose(img)  # Re-saving drops EXIF, so bake in the orientation
+                    img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+                    buf = io.BytesIO()
+                    if img_format == 'PNG':
+                        img.save(buf, 'PNG', optimize=True)
+                    else:
+                        img.convert('RGB').save(buf, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+                    return b64encode(buf.getbuffer())
+        
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return b64encode(mm)
     except Exception as e:
         print(f"ERROR: Could not encode image {filepath}: {e}", flush=True)
         return None
 
+def get_cached_image_base64(filepath: str, max_edge: int = 0) -> Optional[bytes]:
+    """
+    Base64-encode an image (see encode_image_to_base64), reusing the encoding from IMAGE_CACHE_DIR
+    when the file's path, mtime and size and the requested max edge are unchanged since it was cached.
+    """
+    try:
+        st = os.stat(filepath)
+    except OSError as e:
+        print(f"ERROR: Could not encode image {filepath}: {e}", flush=True)
+        return None
+    
+    key = hashlib.blake2b(f"{filepath}:{st.st_mtime}:{st.st_size}:{max_edge if HAS_PIL else 0}".encode('utf-8'), digest_size=8).hexdigest()
+    cache_path = os.path.join(IMAGE_CACHE_DIR, f"{key}.b64")
+    try:
+        with open(cache_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        pass  # Not cached yet
+    
+    base64_image = encode_image_to_base64(filepath, max_edge)
+    if base64_image:
+        try:
+            os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+            # Write to a temp file first so a concurrent or interrupted run never reads a partial entry
+            fd, tmp_path = tempfile.mkstemp(suffix='.tmp', dir=IMAGE_CACHE_DIR)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(base64_image)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            print(f"WARNING: Could not cache encoded image {filepath}: {e}", flush=True)
+    return base64_image
+
 def get_image_mime_type(filepath: str) -> str:
     """Get MIME type for image"""
     ext = os.path.splitext(filepath)[1].lower()
@@ -73,67 +246,50 @@ def get_photo_chunks_by_month(db_file: str) -> List[Dict]:
     """
     Group photos by location and month, selecting 1 random PNG/JPG per location/month.
     Returns list of chunk dictionaries with metadata and selected photo.
+    The grouping and the random pick both run inside SQLite; only one photo row per chunk reaches Python.
     """
     conn = sqlite3.connect(db_file)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA cache_size=-65536')  # 64 MB
+    conn.execute('PRAGMA mmap_size=536870912')  # 512 MB
+    conn.execute('PRAGMA temp_store=MEMORY')  # GROUP BY / window sorts stay off disk
     cursor = conn.cursor()
     
-    # Get all photos with location and datetime
-    # Filter out erroneous 1999 dates and ensure chronological order (oldest to newest)
-    query = '''
-    SELECT id, filename, filepath, datetime, location, camera_model, lens_model,
-           iso, fnumber, exposure_time, focal_length, gps_lat, gps_lon
-    FROM photos
-    WHERE datetime IS NOT NULL 
-      AND location IS NOT NULL
-      AND status = 'processed'
-      AND datetime NOT LIKE '1999%'
-    ORDER BY datetime ASC
-    '''
-    
-    cursor.execute(query)
-    photos = cursor.fetchall()
-    
-    if not photos:
+    # Index carrying every column the aggregate query reads (safe to run on every start)
+    try:
+        cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_photos_story
+        ON photos(status, datetime, location, camera_model, lens_model)
+        ''')
+        conn.commit()
+    except sqlite3.OperationalError as e:
+        print(f"WARNING: Could not create story index (continuing without it): {e}", flush=True)
+    
+    # Prewarm: pull the index pages into the page cache before the real queries
+    # (the database may sit on a slow disk or network share)
+    cursor.execute("SELECT COUNT(*) FROM photos WHERE status = 'processed'").fetchone()
+    
+    # Aggregate photos per location/month
+    # (filters out erroneous 1999 dates; chunks are sorted chronologically below)
+    cursor.execute(CHUNK_AGGREGATES_SQL)
+    groups = cursor.fetchall()
+    
+    if not groups:
         print("No photos found with location and datetime data.")
         conn.close()
         return []
     
-    print(f"Found {len(photos)} photos (excluding 1999 dates).", flush=True)
-    
-    # Group photos by location and month
-    chunks = defaultdict(lambda: {
-        'photos': [],
-        'readable_photos': [],  # Only JPG/PNG
-        'selected_photo': None,
-        'location': None,
-        'year_month': None,
-        'date': None,
-        'cameras': set(),
-        'lens_models': set(),
-        'total_photos': 0
-    })
-    
-    for photo in photos:
-        dt = parse_datetime(photo['datetime'])
-        if not dt:
-            continue
-        
-        # Double-check: filter out 1999 dates (erroneous camera dates)
-        if dt.year == 1999:
-            continue
-        
-        location = photo['location']
-        year_month = f"{dt.year}-{dt.month:02d}"
-        chunk_key = f"{location}|{year_month}"
-        
-        chunk = chunks[chunk_key]
-        chunk['location'] = location
-        chunk['year_month'] = year_month
-        if chunk['date'] is None or dt < chunk['date']:
-            chunk['date'] = dt
-        
-        photo_data = {
+    print(f"Found {sum(g['n'] for g in groups)} photos (excluding 1999 dates).", flush=True)
+    
+    # Pick the photo shown to the vision model for each location/month
+    cursor.execute(CHUNK_SELECTED_PHOTOS_SQL)
+    selected = {}
+    readable_groups = set()
+    for photo in cursor.fetchall():
+        key = (photo['location'], photo['ym'])
+        if photo['readable']:
+            readable_groups.add(key)
+        selected[key] = {
             'id': photo['id'],
             'filename': photo['filename'],
             'filepath': photo['filepath'],
@@ -147,36 +303,23 @@ def get_photo_chunks_by_month(db_file: str) -> List[Dict]:
             'gps_lat': photo['gps_lat'],
             'gps_lon': photo['gps_lon']
         }
-        
-        chunk['photos'].append(photo_data)
-        
-        # Track readable images separately
-        if is_image_readable(photo['filepath']):
-            chunk['readable_photos'].append(photo_data)
-        
-        if photo['camera_model']:
-            chunk['cameras'].add(photo['camera_model'])
-        if photo['lens_model']:
-            chunk['lens_models'].add(photo['lens_model'])
     
-    # Select random readable photo for each chunk
-    # Sort chunks chronologically from oldest to newest
     chunk_list = []
-    sorted_chunks = sorted(chunks.items(), key=lambda x: x[1]['date'] if x[1]['date'] else datetime.max)
+    for group in groups:
+        key = (group['location'], group['ym'])
+        chunk_list.append({
+            'selected_photo': selected.get(key),
+            'has_readable_photo': key in readable_groups,  # selected_photo is a JPG/PNG
+            'location': group['location'],
+            'year_month': group['ym'],
+            'date': parse_datetime(group['first_datetime']),
+            'cameras': sorted(c for c in json.loads(group['cameras']) if c),
+            'lens_models': sorted(l for l in json.loads(group['lens_models']) if l),
+            'total_photos': group['n']
+        })
     
-    for chunk_key, chunk_data in sorted_chunks:
-        chunk_data['total_photos'] = len(chunk_data['photos'])
-        
-        # Select 1 random PNG/JPG image
-        if chunk_data['readable_photos']:
-            chunk_data['selected_photo'] = random.choice(chunk_data['readable_photos'])
-        elif chunk_data['photos']:
-            # Fallback: use any photo if no readable ones
-            chunk_data['selected_photo'] = random.choice(chunk_data['photos'])
-        
-        chunk_data['cameras'] = sorted(list(chunk_data['cameras']))
-        chunk_data['lens_models'] = sorted(list(chunk_data['lens_models']))
-        chunk_list.append(chunk_data)
+    # Sort chunks chronologically from oldest to newest
+    chunk_list.sort(key=lambda c: c['date'] if c['date'] else datetime.max)
     
     # Print date range summary
     if chunk_list:
@@ -198,18 +341,8 @@ def load_metadata(metadata_file: str) -> Dict:
     
     try:
         with open(metadata_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                # Skip comments and empty lines
-                if not line or line.startswith('#'):
-                    continue
-                # Parse key: value pairs
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    key = key.strip()
-                    value = value.strip()
-                    if key and value:
-                        metadata[key] = value
+            # Parse key: value pairs in one pass (comments, empty lines and other text don't match)
+            metadata.update(METADATA_LINE_RE.findall(f.read()))
         return metadata
     except Exception as e:
         print(f"WARNING: Could not read {metadata_file}: {e}", flush=True)
@@ -217,25 +350,11 @@ def load_metadata(metadata_file: str) -> Dict:
 
 def format_exif_data(photo: Dict) -> str:
     """Format EXIF data for a photo into a readable string"""
-    exif_parts = []
-    if photo.get('camera_model'):
-        exif_parts.append(f"Camera: {photo['camera_model']}")
-    if photo.get('lens_model'):
-        exif_parts.append(f"Lens: {photo['lens_model']}")
-    if photo.get('iso'):
-        exif_parts.append(f"ISO: {photo['iso']}")
-    if photo.get('fnumber'):
-        exif_parts.append(f"f/{photo['fnumber']}")
-    if photo.get('exposure_time'):
-        exif_parts.append(f"Exposure: {photo['exposure_time']}s")
-    if photo.get('focal_length'):
-        exif_parts.append(f"Focal Length: {photo['focal_length']}mm")
-    if photo.get('datetime'):
-        exif_parts.append(f"Date/Time: {photo['datetime']}")
+    exif_parts = [fmt.format(value) for key, fmt in EXIF_FIELDS if (value := photo.get(key))]
     if photo.get('gps_lat') and photo.get('gps_lon'):
-        exif_parts.append(f"GPS: {photo['gps_lat']}, {photo['gps_lon']}")
+        exif_parts.append(GPS_FORMAT.format(photo['gps_lat'], photo['gps_lon']))
     
-    return " | ".join(exif_parts) if exif_parts else "No EXIF data"
+    return " | ".join(exif_parts) or "No EXIF data"
 
 def create_data_log(recent_chunks: List[Dict], current_chunk: Dict) -> str:
     """
@@ -264,45 +383,91 @@ def create_data_log(recent_chunks: List[Dict], current_chunk: Dict) -> str:
     
     return "\n".join(log_parts)
 
-def get_story_history(stories_dir: str, last_n: int = 5) -> List[str]:
-    """Get last N story segments for context"""
-    if not os.path.exists(stories_dir):
-        return []
-    
-    # Get all story files sorted by filename (which includes date)
-    story_files = []
-    for filename in os.listdir(stories_dir):
-        if filename.endswith('.md') and filename != 'metadata.md':
-            story_files.append(filename)
-    
-    story_files.sort()  # Sort by filename (date-sequential)
-    
-    # Get last N files
-    recent_files = story_files[-last_n:] if len(story_files) > last_n else story_files
-    
-    history = []
-    for filename in recent_files:
-        filepath = os.path.join(stories_dir, filename)
+def create_llm_client(base_url: str, concurrency: int):
+    """
+    Create the client used by request_completion: an aiohttp session when available
+    (its connection pool handles many concurrent keep-alive requests well), otherwise
+    openai.AsyncOpenAI. Both are closed with `await client.close()`.
+    """
+    if HAS_AIOHTTP:
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            headers={"Authorization": "Bearer not-needed"}
+        )
+    # Retries are handled by request_completion
+    return openai.AsyncOpenAI(base_url=base_url, api_key="not-needed", max_retries=0)
+
+def is_transient_error(e: Exception) -> bool:
+    """True for request errors worth retrying: connection failures, timeouts, rate limiting and server errors"""
+    if HAS_AIOHTTP:
+        if isinstance(e, aiohttp.ClientResponseError):
+            return e.status == 429 or e.status >= 500
+        if isinstance(e, aiohttp.ClientError):
+            return True
+    if HAS_OPENAI and isinstance(e, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(e, asyncio.TimeoutError)
+
+async def send_completion(client, base_url: str, request: Dict) -> str:
+    """Send one chat completions request and return the reply text"""
+    if HAS_AIOHTTP:
+        async with client.post(f"{base_url.rstrip('/')}/chat/completions", json=request) as response:
+            response.raise_for_status()
+            data = await response.json()
+        return data["choices"][0]["message"]["content"]
+    
+    response = await client.chat.completions.create(**request)
+    return response.choices[0].message.content
+
+def open_response_cache(cache_file: str) -> sqlite3.Connection:
+    """Open (creating if needed) the SQLite cache of LLM replies"""
+    conn = sqlite3.connect(cache_file)
+    conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL)')
+    conn.commit()
+    return conn
+
+async def request_completion(client, base_url: str, model: str, messages: List[Dict]) -> str:
+    """
+    Send messages to the chat completions endpoint and return the reply text.
+    Replies already in the response cache (if enabled) are returned without calling the LLM.
+    Waits for the rate limiter (if any) before each attempt and retries transient errors
+    with exponential backoff and jitter.
+    """
+    request = {"model": model, "messages": messages, "temperature": 0.7, "max_tokens": 2000}
+    cache_key = None
+    if _response_cache is not None:
+        cache_key = hashlib.blake2b(json.dumps(request, sort_keys=True).encode('utf-8')).hexdigest()
+        row = _response_cache.execute('SELECT text FROM responses WHERE key = ?', (cache_key,)).fetchone()
+        if row:
+            return row[0]
+    
+    for attempt in range(MAX_REQUEST_ATTEMPTS):
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if content:
-                    history.append(content)
+            if _rate_limiter is not None:
+                async with _rate_limiter:
+                    text = await send_completion(client, base_url, request)
+            else:
+                text = await send_completion(client, base_url, request)
+            break
         except Exception as e:
-            print(f"WARNING: Could not read {filename}: {e}", flush=True)
-    
-    return history
+            if attempt == MAX_REQUEST_ATTEMPTS - 1 or not is_transient_error(e):
+                raise
+            wait = random.uniform(0, min(RETRY_MAX_WAIT, RETRY_BASE_WAIT * 2 ** attempt))
+            print(f"  Request failed ({e}), retrying in {wait:.1f}s...", flush=True)
+            await asyncio.sleep(wait)
+    
+    if cache_key is not None and text is not None:
+        _response_cache.execute('INSERT OR REPLACE INTO responses (key, text) VALUES (?, ?)', (cache_key, text))
+        _response_cache.commit()
+    return text
 
-def generate_story_segment(chunk: Dict, recent_chunks: List[Dict], metadata: Dict, 
-                          client, model: str, sequence_num: int) -> str:
+def build_persona_prefix(metadata: Dict) -> str:
     """
-    Generate a single story segment using LLM with image vision.
-    Returns the story text.
+    Opening of every request's user text: the persona line (from metadata) and the data heading.
+    Built once per run so each request starts with the identical prefix, which LMStudio can
+    reuse from its prompt cache instead of re-processing.
     """
-    # Create structured data log
-    data_log = create_data_log(recent_chunks, chunk)
-    
-    # Prepare context
     context_parts = []
     
     # Add metadata context
@@ -310,18 +475,55 @@ def generate_story_segment(chunk: Dict, recent_chunks: List[Dict], metadata: Dic
         context_parts.append(f"You are {metadata.get('Name', 'Traveler')}, from {metadata.get('Hometown', 'Unknown')}.")
         context_parts.append("")
     
-    # Add the structured data log
     context_parts.append("Photo Activity Data:")
     context_parts.append("")
-    context_parts.append(data_log)
     context_parts.append("")
+    return chr(10).join(context_parts)
+
+def build_context_text(persona_prefix: str, data_logs: List[str]) -> str:
+    """Persona prefix (see build_persona_prefix) followed by the photo activity data logs"""
+    return persona_prefix + "\n\n".join(data_logs) + "\n"
+
+async def build_image_content(chunk: Dict, image_max_edge: int = DEFAULT_IMAGE_MAX_EDGE) -> Optional[Dict]:
+    """Image message part for the chunk's selected photo, or None if it can't be sent to the vision model"""
+    if not (chunk['selected_photo'] and chunk['selected_photo']['filepath']):
+        return None
+    image_path = chunk['selected_photo']['filepath']
+    if not (os.path.exists(image_path) and is_image_readable(image_path)):
+        return None
+    
+    # Encode on a worker thread so other segments' requests keep flowing meanwhile
+    base64_image = await asyncio.to_thread(get_cached_image_base64, image_path, image_max_edge)
+    if not base64_image:
+        return None
+    
+    mime_type = get_image_mime_type(image_path)
+    print(f"  Including image: {os.path.basename(image_path)}", flush=True)
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": (b"data:" + mime_type.encode('ascii') + b";base64," + base64_image).decode('ascii')
+        }
+    }
+
+def fallback_narrative(chunk: Dict) -> str:
+    """Narrative used when the LLM request for a segment fails"""
+    date_str = chunk['date'].strftime("%B %d, %Y") if chunk['date'] else "Unknown date"
+    return f"On {date_str}, I visited {chunk['location']}. {chunk['total_photos']} photos were taken here this month."
+
+async def generate_story_segment(chunk: Dict, recent_chunks: List[Dict], persona_prefix: str, 
+                                client, base_url: str, model: str, sequence_num: int,
+                                image_max_edge: int = DEFAULT_IMAGE_MAX_EDGE) -> str:
+    """
+    Generate a single story segment using LLM with image vision.
+    Returns the story text.
+    """
+    # Create structured data log
+    data_log = create_data_log(recent_chunks, chunk)
     
     # Prepare image if available
     messages = [
-        {
-            "role": "system",
-            "content": "You are a writer creating a personal life story narrative from actual photo data. You will be given structured data logs showing dates, locations, photo counts, and EXIF data. Write about the ACTUAL data provided - do not make up events, locations, or details that are not in the data. Reference the image when relevant. Keep it natural and flowing, but stay grounded in the facts provided."
-        },
+        SYSTEM_MESSAGE,
         {
             "role": "user",
             "content": []
@@ -332,41 +534,89 @@ def generate_story_segment(chunk: Dict, recent_chunks: List[Dict], metadata: Dic
     user_content = messages[1]["content"]
     user_content.append({
         "type": "text",
-        "text": f"{chr(10).join(context_parts)}\n\nBased on the photo activity data above, write a personal narrative entry. Use ONLY the information provided in the data log. Describe what you see in the image and connect it to the location and date information. If there are multiple locations in the recent activity, note the progression from one place to another. Do not invent details not present in the data."
+        "text": f"{build_context_text(persona_prefix, [data_log])}\n\nBased on the photo activity data above, write a personal narrative entry. Use ONLY the information provided in the data log. Describe what you see in the image and connect it to the location and date information. If there are multiple locations in the recent activity, note the progression from one place to another. Do not invent details not present in the data."
     })
     
     # Add image if available
-    if chunk['selected_photo'] and chunk['selected_photo']['filepath']:
-        image_path = chunk['selected_photo']['filepath']
-        if os.path.exists(image_path) and is_image_readable(image_path):
-            base64_image = encode_image_to_base64(image_path)
-            if base64_image:
-                mime_type = get_image_mime_type(image_path)
-                user_content.append({
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:{mime_type};base64,{base64_image}"
-                    }
-                })
-                print(f"  Including image: {os.path.basename(image_path)}", flush=True)
+    image_content = await build_image_content(chunk, image_max_edge)
+    if image_content:
+        user_content.append(image_content)
     
     try:
         print(f"Generating story segment {sequence_num} for {chunk['location']}...", flush=True)
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=2000
-        )
-        
-        story_text = response.choices[0].message.content
+        story_text = await request_completion(client, base_url, model, messages)
         return story_text
         
     except Exception as e:
         print(f"ERROR: Failed to generate story segment: {e}", flush=True)
-        # Fallback narrative
-        date_str = chunk['date'].strftime("%B %d, %Y") if chunk['date'] else "Unknown date"
-        return f"On {date_str}, I visited {chunk['location']}. {chunk['total_photos']} photos were taken here this month."
+        return fallback_narrative(chunk)
+
+def parse_batch_reply(reply: str, expected: int) -> Optional[List[str]]:
+    """
+    Parse a batched reply into its narratives (a JSON array of strings, possibly wrapped in
+    a ```json fence). Returns None if the reply doesn't hold exactly `expected` strings.
+    """
+    start, end = reply.find('['), reply.rfind(']')
+    if start == -1 or end < start:
+        return None
+    try:
+        stories = json.loads(reply[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(stories, list) or len(stories) != expected or not all(isinstance(t, str) for t in stories):
+        return None
+    return stories
+
+async def generate_story_batch(batch: List[Tuple[Dict, List[Dict], int]], persona_prefix: str,
+                               client, base_url: str, model: str,
+                               image_max_edge: int = DEFAULT_IMAGE_MAX_EDGE) -> List[str]:
+    """
+    Generate several story segments in one request. batch holds (chunk, recent_chunks, sequence_num)
+    entries; the system prompt and persona are sent once and the model answers with a JSON array
+    holding one narrative per entry. Falls back to one request per segment if that reply can't be parsed.
+    Returns the story texts in batch order.
+    """
+    data_logs = [
+        f"Entry {i}:\n{create_data_log(recent_chunks, chunk)}"
+        for i, (chunk, recent_chunks, _) in enumerate(batch, 1)
+    ]
+    
+    messages = [
+        SYSTEM_MESSAGE,
+        {
+            "role": "user",
+            "content": []
+        }
+    ]
+    
+    user_content = messages[1]["content"]
+    user_content.append({
+        "type": "text",
+        "text": f"{build_context_text(persona_prefix, data_logs)}\nBased on the photo activity data above, write a personal narrative entry for each of the {len(batch)} entries. Use ONLY the information provided in each entry's data log. Describe what you see in the entry's image (if one is attached) and connect it to the location and date information. If there are multiple locations in the recent activity, note the progression from one place to another. Do not invent details not present in the data.\n\nReturn a JSON array of {len(batch)} strings where element i is the narrative for Entry i, and nothing else."
+    })
+    
+    # Label each image with its entry, since not every entry has one
+    for i, (chunk, _, _) in enumerate(batch, 1):
+        image_content = await build_image_content(chunk, image_max_edge)
+        if image_content:
+            user_content.append({"type": "text", "text": f"Image for Entry {i}:"})
+            user_content.append(image_content)
+    
+    first_seq, last_seq = batch[0][2], batch[-1][2]
+    try:
+        print(f"Generating story segments {first_seq}-{last_seq} in one request...", flush=True)
+        stories = parse_batch_reply(await request_completion(client, base_url, model, messages), len(batch))
+        if stories is not None:
+            return stories
+        print(f"WARNING: Batched reply for segments {first_seq}-{last_seq} was not a JSON array of {len(batch)} narratives, retrying one by one", flush=True)
+    except Exception as e:
+        print(f"ERROR: Failed to generate story segments {first_seq}-{last_seq}: {e}", flush=True)
+        return [fallback_narrative(chunk) for chunk, _, _ in batch]
+    
+    return [
+        await generate_story_segment(chunk, recent_chunks, persona_prefix, client, base_url, model, sequence_num, image_max_edge)
+        for chunk, recent_chunks, sequence_num in batch
+    ]
 
 def write_story_file(stories_dir: str, chunk: Dict, story_text: str, sequence_num: int):
     """Write story segment to markdown file: YYYY-MM-DD-SEQUENCE#-LOCATION.md"""
@@ -396,6 +646,81 @@ def write_story_file(stories_dir: str, chunk: Dict, story_text: str, sequence_nu
     print(f"  Written: {filename}", flush=True)
     return filepath
 
+def write_story_files(stories_dir: str, batch: List[Tuple[Dict, List[Dict], int]], story_texts: List[str]):
+    """Write the story files for a batch of segments (see generate_story_batch)"""
+    for (chunk, _, sequence_num), story_text in zip(batch, story_texts):
+        write_story_file(stories_dir, chunk, story_text, sequence_num)
+
+async def generate_and_write_segment(semaphore: asyncio.Semaphore, stories_dir: str, chunk: Dict,
+                                     recent_chunks: List[Dict], persona_prefix: str, client, base_url: str,
+                                     model: str, sequence_num: int, image_max_edge: int = DEFAULT_IMAGE_MAX_EDGE):
+    """Generate one story segment (waiting for a free slot in semaphore) and write its file"""
+    async with semaphore:
+        story_text = await generate_story_segment(
+            chunk, recent_chunks, persona_prefix, client, base_url, model, sequence_num, image_max_edge
+        )
+    # Write on a worker thread so the event loop keeps handling other segments' responses
+    await asyncio.to_thread(write_story_file, stories_dir, chunk, story_text, sequence_num)
+
+async def generate_and_write_batch(semaphore: asyncio.Semaphore, stories_dir: str,
+                                   batch: List[Tuple[Dict, List[Dict], int]], persona_prefix: str,
+                                   client, base_url: str, model: str, image_max_edge: int = DEFAULT_IMAGE_MAX_EDGE):
+    """Generate a batch of story segments in one request (waiting for a free slot in semaphore) and write their files"""
+    async with semaphore:
+        story_texts = await generate_story_batch(batch, persona_prefix, client, base_url, model, image_max_edge)
+    await asyncio.to_thread(write_story_files, stories_dir, batch, story_texts)
+
+async def generate_all_segments(chunks: List[Dict], persona_prefix: str, args) -> int:
+    """
+    Generate and write a story segment per chunk, keeping up to args.concurrency
+    LLM requests in flight, each covering args.batch_size segments.
+    Returns the number of segments generated.
+    """
+    global _rate_limiter, _response_cache
+    
+    # Setup LMStudio client
+    concurrency = max(1, args.concurrency)
+    batch_size = max(1, args.batch_size)
+    client = create_llm_client(args.base_url, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    _rate_limiter = AsyncLimiter(args.rpm, 60) if args.rpm > 0 and HAS_AIOLIMITER else None
+    _response_cache = None if args.no_cache else open_response_cache(STORY_CACHE_FILE)
+    
+    # Each segment's data log only needs the earlier chunks' metadata (not their stories),
+    # so segments are independent and can be generated in any order
+    # (the last N chunks before each one are kept in a rolling window for its data log context)
+    entries = []
+    history = collections.deque(maxlen=max(0, args.history_size))
+    for i, chunk in enumerate(chunks):
+        entries.append((chunk, list(history), i + 1))
+        history.append(chunk)
+    
+    if batch_size == 1:
+        tasks = [
+            generate_and_write_segment(
+                semaphore, args.stories_dir, chunk, recent_chunks, persona_prefix, client, args.base_url, args.model,
+                sequence_num, args.image_max_edge
+            )
+            for chunk, recent_chunks, sequence_num in entries
+        ]
+    else:
+        tasks = [
+            generate_and_write_batch(
+                semaphore, args.stories_dir, entries[i:i + batch_size], persona_prefix, client, args.base_url, args.model,
+                args.image_max_edge
+            )
+            for i in range(0, len(entries), batch_size)
+        ]
+    
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await client.close()
+        if _response_cache is not None:
+            _response_cache.close()
+            _response_cache = None
+    return len(entries)
+
 def main():
     parser = argparse.ArgumentParser(
         description='Generate travel stories from photo metadata using LMStudio with vision',
@@ -410,6 +735,9 @@ Examples:
 
   # Custom stories directory
   python story_agent.py --db library7.db --stories-dir ./my_stories
+
+  # Request 4 segments per LLM call
+  python story_agent.py --db library7.db --batch-size 4
         """
     )
     
@@ -425,6 +753,16 @@ Examples:
                        help='Path to metadata.md file (default: metadata.md in current directory)')
     parser.add_argument('--history-size', type=int, default=5,
                        help='Number of previous segments to include as context (default: 5)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                       help=f'Number of story segments to generate at the same time (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='Story segments to request in a single LLM call (default: 1; keep small, e.g. 4-8, to fit the context window)')
+    parser.add_argument('--rpm', type=int, default=0,
+                       help='Maximum LLM requests per minute (default: 0, unlimited; needs aiolimiter)')
+    parser.add_argument('--no-cache', action='store_true',
+                       help=f'Always call the LLM instead of reusing replies cached in {STORY_CACHE_FILE} by earlier runs')
+    parser.add_argument('--image-max-edge', type=int, default=DEFAULT_IMAGE_MAX_EDGE,
+                       help=f'Downscale photos to this many pixels on the longest edge before sending them (default: {DEFAULT_IMAGE_MAX_EDGE}; 0 sends originals; needs Pillow)')
     
     args = parser.parse_args()
     
@@ -432,8 +770,8 @@ Examples:
         print(f"ERROR: Database '{args.db}' does not exist.", flush=True)
         sys.exit(1)
     
-    if not HAS_OPENAI:
-        print("ERROR: openai library required. Install with: pip install openai", flush=True)
+    if not HAS_AIOHTTP and not HAS_OPENAI:
+        print("ERROR: aiohttp or openai library required. Install with: pip install aiohttp", flush=True)
         sys.exit(1)
     
     print("="*60, flush=True)
@@ -441,7 +779,16 @@ Examples:
     print("="*60, flush=True)
     print(f"Database: {args.db}", flush=True)
     print(f"LMStudio: {args.base_url}", flush=True)
-    print(f"Model: {args.model}\n", flush=True)
+    print(f"Model: {args.model}", flush=True)
+    print(f"Concurrency: {args.concurrency}", flush=True)
+    print(f"Batch size: {args.batch_size}", flush=True)
+    print(f"Requests per minute: {args.rpm or 'unlimited'}", flush=True)
+    print(f"Response cache: {'off' if args.no_cache else STORY_CACHE_FILE}", flush=True)
+    print(f"Image max edge: {args.image_max_edge or 'original'}\n", flush=True)
+    if args.image_max_edge > 0 and not HAS_PIL:
+        print("WARNING: Pillow not found, sending original images. Install with: pip install pillow\n", flush=True)
+    if args.rpm > 0 and not HAS_AIOLIMITER:
+        print("WARNING: aiolimiter not found, requests will not be rate limited. Install with: pip install aiolimiter\n", flush=True)
     
     # Load metadata from disk
     print("Loading metadata...", flush=True)
@@ -467,35 +814,17 @@ Examples:
     
     print(f"Found {len(chunks)} location/month chunks", flush=True)
     total_photos = sum(c['total_photos'] for c in chunks)
-    photos_with_images = sum(1 for c in chunks if c['selected_photo'] and is_image_readable(c['selected_photo']['filepath']))
+    photos_with_images = sum(c['has_readable_photo'] for c in chunks)
     print(f"Total photos: {total_photos}", flush=True)
     print(f"Chunks with readable images: {photos_with_images}\n", flush=True)
     
-    # Setup LMStudio client
-    client = openai.OpenAI(base_url=args.base_url, api_key="not-needed")
-    
-    # Generate story segments sequentially
+    # Generate story segments concurrently
     print("Generating story segments...\n", flush=True)
-    sequence_num = 1
-    
-    for i, chunk in enumerate(chunks):
-        # Get recent chunks for data log context (last N chunks before current)
-        recent_chunks = chunks[max(0, i - args.history_size):i] if i > 0 else []
-        
-        # Generate story segment
-        story_text = generate_story_segment(
-            chunk, recent_chunks, metadata, client, args.model, sequence_num
-        )
-        
-        # Write to file
-        write_story_file(args.stories_dir, chunk, story_text, sequence_num)
-        
-        sequence_num += 1
-        print("", flush=True)  # Blank line between segments
+    segment_count = asyncio.run(generate_all_segments(chunks, build_persona_prefix(metadata), args))
     
     print("="*60, flush=True)
     print(f"Story generation complete!", flush=True)
-    print(f"Generated {sequence_num - 1} story segments", flush=True)
+    print(f"Generated {segment_count} story segments", flush=True)
     print(f"Stories written to: {args.stories_dir}", flush=True)
     print("="*60, flush=True)
 
@@ -5,10 +5,16 @@ Reads markdown story files and serves them with linked images
 """
 
 import os
+import mimetypes
 import re
+import threading
+import time
+from urllib.parse import quote
+from operator import itemgetter
 from datetime import datetime
-from flask import Flask, render_template_string, send_from_directory, abort
-import glob
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, Response, send_file, abort, request
 
 # Try to import markdown, fallback to simple conversion
 try:
@@ -16,10 +22,30 @@ try:
     HAS_MARKDOWN = True
 except ImportError:
     HAS_MARKDOWN = False
+    # Separators for the fallback converter (paragraphs on blank lines, <br> for line breaks)
+    PARAGRAPH_SEPARATOR = '\n\n'
+    LINE_SEPARATOR = '\n'
+    LINE_BREAK = '<br>'
+    
     def markdown(text):
         # Simple markdown to HTML conversion
-        paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-        return '\n'.join(f'<p>{p.replace(chr(10), "<br>")}</p>' for p in paragraphs)
+        paragraphs = [p for p in map(str.strip, text.split(PARAGRAPH_SEPARATOR)) if p]
+        return LINE_SEPARATOR.join(['<p>' + p.replace(LINE_SEPARATOR, LINE_BREAK) + '</p>' for p in paragraphs])
+
+# Try to import waitress to serve with a production WSGI server, fallback to Flask's server
+try:
+    from waitress import serve
+    HAS_WAITRESS = True
+except ImportError:
+    HAS_WAITRESS = False
+
+# Try to import watchdog to watch the stories and photos directories, fallback to mtime/TTL polling
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    HAS_WATCHDOG = True
+except ImportError:
+    HAS_WATCHDOG = False
 
 app = Flask(__name__)
 
@@ -27,104 +53,327 @@ app = Flask(__name__)
 STORIES_DIR = 'stories'
 PHOTOS_BASE_PATH = '/Volumes/E1999/photos_backup'
 
-def parse_story_file(filepath):
-    """Parse a markdown story file and extract metadata"""
-    with open(filepath, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Extract metadata
+# Worker threads for waitress (photo requests from a story page are served in parallel)
+SERVER_THREADS = 8
+
+# Browser cache lifetime for photos (seconds, marked immutable); revalidated with ETag/Last-Modified after that
+PHOTO_MAX_AGE = 31536000
+
+# Set to True when running behind Apache with mod_xsendfile (or lighttpd) so the front-end server
+# sends photo files itself; Flask then only returns an X-Sendfile header
+USE_X_SENDFILE = False
+app.config['USE_X_SENDFILE'] = USE_X_SENDFILE
+
+# Set (e.g. to '/_photos/') when running behind nginx with an internal location aliased to
+# PHOTOS_BASE_PATH; Flask then only resolves the filename and nginx sends the file:
+#   location /_photos/ { internal; alias /Volumes/E1999/photos_backup/; }
+X_ACCEL_PHOTOS_PREFIX = None
+
+# Story header lines written by story_agent.py ("**Field:** value") -> metadata key
+STORY_HEADER_FIELDS = (
+    ('**Date:**', 'date'),
+    ('**Photo:**', 'photo'),
+    ('**Total Photos:**', 'total_photos'),
+)
+LEADING_DIGITS_RE = re.compile(r'\d+')
+
+# Parsed story headers kept in memory (see parse_story_header_cached)
+STORY_CACHE_SIZE = 4096
+
+# Parsed and rendered story pages kept in memory (see render_story_cached)
+STORY_HTML_CACHE_SIZE = 1024
+
+# Sorted story list from the last get_all_stories() call, keyed by the stories directory's mtime
+# (with a watcher running, 'stale' is set on any change in the directory instead)
+STORIES_CACHE = {'mtime_ns': None, 'built_at': 0.0, 'stale': True, 'stories': [], 'index_rows': []}
+
+# True once start_watchers() is watching the stories directory
+STORIES_WATCHED = False
+
+# Seconds a cached story list is trusted before files are re-checked for in-place edits
+STORIES_CACHE_TTL = 10
+
+# Threads used to parse story headers when the story list is (re)built
+PARSE_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+
+# Case-folded filename -> full path, built by init_photo_index()
+PHOTO_INDEX = {}
+PHOTO_INDEX_BUILT_AT = 0.0
+PHOTO_INDEX_LOCK = threading.Lock()  # Held by the one request thread re-walking after a miss
+PHOTOS_WATCHED = False  # True once start_watchers() keeps PHOTO_INDEX current (no re-walks needed)
+
+# Seconds before a lookup miss re-walks PHOTOS_BASE_PATH to pick up newly added photos
+PHOTO_INDEX_TTL = 30
+
+def parse_story_header_lines(lines, filepath):
+    """
+    Extract a story's metadata (title, header fields, sort date) from its lines.
+    Stops at the --- separator, so the story body is never looked at.
+    """
     metadata = {
         'filename': os.path.basename(filepath),
         'title': '',
         'date': '',
         'photo': '',
-        'total_photos': '',
-        'content': content
+        'total_photos': ''
     }
     
-    # Extract title (first # heading)
-    title_match = re.search(r'^#\s+(.+)$', content, re.MULTILINE)
-    if title_match:
-        metadata['title'] = title_match.group(1)
-    
-    # Extract date
-    date_match = re.search(r'\*\*Date:\*\*\s+(.+)$', content, re.MULTILINE)
-    if date_match:
-        metadata['date'] = date_match.group(1)
-    
-    # Extract photo filename
-    photo_match = re.search(r'\*\*Photo:\*\*\s+(.+)$', content, re.MULTILINE)
-    if photo_match:
-        metadata['photo'] = photo_match.group(1).strip()
-    
-    # Extract total photos
-    total_match = re.search(r'\*\*Total Photos:\*\*\s+(\d+)', content, re.MULTILINE)
-    if total_match:
-        metadata['total_photos'] = total_match.group(1)
-    
-    # Extract story content (after the --- separator)
-    parts = content.split('---')
-    if len(parts) > 1:
-        metadata['story_content'] = parts[-1].strip()
-    else:
-        metadata['story_content'] = content
+    # Extract the title (first # heading) and header fields in one pass over the lines
+    # above the --- separator (the first value found for each wins)
+    for line in lines:
+        line = line.rstrip('\n')
+        if line == '---':
+            break
+        if line.startswith('#'):
+            if not metadata['title'] and line[1:2].isspace() and line[1:].strip():
+                metadata['title'] = line[1:].lstrip()
+            continue
+        if not line.startswith('**'):
+            continue
+        for prefix, key in STORY_HEADER_FIELDS:
+            if line.startswith(prefix):
+                value = line[len(prefix):]
+                if not metadata[key] and value[:1].isspace() and value.strip():
+                    value = value.lstrip()
+                    if key == 'photo':
+                        value = value.rstrip()
+                    elif key == 'total_photos':
+                        digits = LEADING_DIGITS_RE.match(value)
+                        value = digits.group() if digits else ''
+                    metadata[key] = value
+                break
     
     # Parse date for sorting
+    name = metadata['filename']
     try:
-        # Try to parse date from filename (YYYY-MM-DD format)
-        date_str = os.path.basename(filepath)[:10]
-        metadata['date_obj'] = datetime.strptime(date_str, '%Y-%m-%d')
-    except:
+        # Date from the filename's YYYY-MM-DD prefix, sliced directly (strptime is much slower)
+        if not (name[4:5] == '-' and name[7:8] == '-' and name[:4].isdigit() and name[5:7].isdigit() and name[8:10].isdigit()):
+            raise ValueError(name)
+        metadata['date_obj'] = datetime(int(name[:4]), int(name[5:7]), int(name[8:10]))
+    except ValueError:
         try:
             # Try to parse from date field
-            if metadata['date']:
-                # Handle formats like "September 21, 2008" or "December 31, 1969"
-                metadata['date_obj'] = datetime.strptime(metadata['date'], '%B %d, %Y')
-        except:
+            # Handle formats like "September 21, 2008" or "December 31, 1969"
+            metadata['date_obj'] = datetime.strptime(metadata['date'], '%B %d, %Y')
+        except ValueError:
             metadata['date_obj'] = datetime.min
+    # Plain int sort key (dates carry no time of day, so ordering is unchanged)
+    metadata['date_key'] = metadata['date_obj'].toordinal()
+    
+    return metadata
+
+def parse_story_header(filepath):
+    """Read only a story file's header (up to the --- separator) and extract its metadata, for the index"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return parse_story_header_lines(f, filepath)
+
+def parse_story_file(filepath):
+    """
+    Parse a markdown story file and extract metadata.
+    Header lines are read up to the --- separator line and only the rest of the file is kept
+    as story content (after its last ---, as before).
+    """
+    header = []
+    body = None
+    with open(filepath, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.rstrip('\n') == '---':
+                body = f.read()
+                break
+            header.append(line)
+    
+    # Extract metadata
+    metadata = parse_story_header_lines(header, filepath)
+    
+    # Extract story content (after the --- separator)
+    if body is not None:
+        metadata['story_content'] = body.split('---')[-1].strip()
+    else:
+        content = ''.join(header)
+        parts = content.split('---')
+        metadata['story_content'] = parts[-1].strip() if len(parts) > 1 else content
     
     return metadata
 
+@lru_cache(maxsize=STORY_CACHE_SIZE)
+def parse_story_header_cached(filepath, mtime_ns):
+    """
+    parse_story_header, memoized on the file's modification time: an edited file gets a new
+    cache key, so unchanged stories are never re-read or re-parsed.
+    The returned dict is shared between calls and must not be modified.
+    """
+    return parse_story_header(filepath)
+
+@lru_cache(maxsize=STORY_HTML_CACHE_SIZE)
+def render_story_cached(filepath, mtime_ns):
+    """
+    Parse a story file and convert its content to HTML, memoized on the file's modification
+    time (see parse_story_header_cached). Returns (story, story_html).
+    """
+    story = parse_story_file(filepath)
+    # markdown() is the simple paragraph/line-break converter when the library isn't installed
+    return story, markdown(story['story_content'])
+
+def init_photo_index():
+    """
+    Walk PHOTOS_BASE_PATH once and index every file by case-folded filename,
+    so photo lookups are a dict lookup instead of a recursive glob.
+    Returns the number of indexed files.
+    """
+    global PHOTO_INDEX, PHOTO_INDEX_BUILT_AT
+    # Stamped before walking so misses during a long walk don't each start another one
+    PHOTO_INDEX_BUILT_AT = time.monotonic()
+    index = {}
+    for root, _, files in os.walk(PHOTOS_BASE_PATH):
+        for name in files:
+            index.setdefault(name.casefold(), os.path.join(root, name))
+    # Swap in the finished index so concurrent requests never see a partial one
+    PHOTO_INDEX = index
+    return len(index)
+
 def find_photo_path(photo_filename):
     """Find the full path to a photo file in the photos_backup directory"""
     if not photo_filename:
         return None
     
-    # Search for the file recursively in photos_backup
-    search_patterns = [
-        os.path.join(PHOTOS_BASE_PATH, '**', photo_filename),
-        os.path.join(PHOTOS_BASE_PATH, '**', photo_filename.upper()),
-        os.path.join(PHOTOS_BASE_PATH, '**', photo_filename.lower()),
-    ]
-    
-    for pattern in search_patterns:
-        matches = glob.glob(pattern, recursive=True)
-        if matches:
-            return matches[0]
-    
-    return None
+    key = photo_filename.casefold()
+    path = PHOTO_INDEX.get(key)
+    # Re-index on a miss (at most every PHOTO_INDEX_TTL seconds) in case the photo was added
+    # or the volume was mounted after the last walk. Only one thread walks; other misses
+    # meanwhile return None instead of waiting on (or repeating) the walk
+    # A watcher updates the index in place, and a re-walk would swap in a new dict that loses
+    # its updates, so misses aren't re-walked while one is running
+    if path is None and not PHOTOS_WATCHED and time.monotonic() - PHOTO_INDEX_BUILT_AT > PHOTO_INDEX_TTL:
+        if PHOTO_INDEX_LOCK.acquire(blocking=False):
+            try:
+                if time.monotonic() - PHOTO_INDEX_BUILT_AT > PHOTO_INDEX_TTL:
+                    init_photo_index()
+            finally:
+                PHOTO_INDEX_LOCK.release()
+            path = PHOTO_INDEX.get(key)
+    return path
+
+def load_story_header(entry):
+    """Parse one story directory entry's header, or None if it can't be parsed"""
+    try:
+        return parse_story_header_cached(entry.path, entry.stat().st_mtime_ns)
+    except Exception as e:
+        print(f"Error parsing {entry.name}: {e}")
+        return None
 
 def get_all_stories():
-    """Get all story files sorted by date"""
-    stories = []
+    """
+    Get all story files sorted by date.
+    The sorted list is reused while the stories directory's mtime (changed by adding, removing
+    or renaming files) is unchanged; it is still rebuilt every STORIES_CACHE_TTL seconds to
+    pick up files rewritten in place, which is cheap since unchanged files are memoized.
+    With a watcher running (start_watchers), it is rebuilt exactly when a change is reported.
+    The returned list is shared between calls and must not be modified.
+    """
+    # A running watcher reports every change, so until then the list is used without a stat
+    if STORIES_WATCHED and not STORIES_CACHE['stale']:
+        return STORIES_CACHE['stories']
+    
     stories_path = os.path.join(os.path.dirname(__file__), STORIES_DIR)
+    # Cleared before the scan, so a change made while rebuilding marks the list stale again
+    STORIES_CACHE['stale'] = False
+    
+    try:
+        dir_mtime_ns = os.stat(stories_path).st_mtime_ns
+    except OSError:
+        STORIES_CACHE.update(mtime_ns=None, stories=[], index_rows=[])
+        return []
     
-    if not os.path.exists(stories_path):
-        return stories
+    # Without a watcher, trust the list while the directory mtime is unchanged (up to the TTL);
+    # with one, getting here means a change was reported (possibly an in-place rewrite, which
+    # leaves the directory mtime alone), so always rebuild
+    now = time.monotonic()
+    if (not STORIES_WATCHED and STORIES_CACHE['mtime_ns'] == dir_mtime_ns
+            and now - STORIES_CACHE['built_at'] < STORIES_CACHE_TTL):
+        return STORIES_CACHE['stories']
     
-    for filename in os.listdir(stories_path):
-        if filename.endswith('.md') and filename != 'metadata.md':
-            filepath = os.path.join(stories_path, filename)
-            try:
-                story = parse_story_file(filepath)
-                stories.append(story)
-            except Exception as e:
-                print(f"Error parsing {filename}: {e}")
+    # scandir yields each name from one directory read; the per-file mtime is the parse cache key
+    story_files = []
+    with os.scandir(stories_path) as entries:
+        for entry in entries:
+            # is_file() comes from the directory entry's type, without a stat
+            if entry.name.endswith('.md') and entry.name != 'metadata.md' and entry.is_file():
+                story_files.append(entry)
+    
+    # Parse in a thread pool so a cold start overlaps file reads; memoized files return immediately
+    with ThreadPoolExecutor(max_workers=PARSE_WORKERS) as executor:
+        stories = [story for story in executor.map(load_story_header, story_files) if story is not None]
     
     # Sort by date (oldest first)
-    stories.sort(key=lambda x: x['date_obj'])
+    stories.sort(key=itemgetter('date_key'))
+    # Flat rows for the index template, built once per refresh rather than looked up per render
+    index_rows = [
+        (story['filename'], story['title'], story['date'], story['total_photos'], story['photo'])
+        for story in stories
+    ]
+    STORIES_CACHE.update(mtime_ns=dir_mtime_ns, built_at=now, stories=stories, index_rows=index_rows)
     return stories
 
+if HAS_WATCHDOG:
+    class StoriesEventHandler(FileSystemEventHandler):
+        """Marks the cached story list stale when a file in the stories directory changes"""
+        def mark_stale(self, event):
+            STORIES_CACHE['stale'] = True
+        
+        # Only content changes; opened/closed events (e.g. every read of a story) are ignored
+        on_created = on_deleted = on_modified = on_moved = mark_stale
+    
+    class PhotosEventHandler(FileSystemEventHandler):
+        """Keeps PHOTO_INDEX in step with files added, removed or renamed under PHOTOS_BASE_PATH"""
+        def add(self, path):
+            PHOTO_INDEX.setdefault(os.path.basename(path).casefold(), path)
+        
+        def remove(self, path):
+            key = os.path.basename(path).casefold()
+            if PHOTO_INDEX.get(key) == path:
+                del PHOTO_INDEX[key]
+        
+        def on_created(self, event):
+            if not event.is_directory:
+                self.add(event.src_path)
+        
+        def on_deleted(self, event):
+            if not event.is_directory:
+                self.remove(event.src_path)
+        
+        def on_moved(self, event):
+            if not event.is_directory:
+                self.remove(event.src_path)
+                self.add(event.dest_path)
+
+def start_watchers():
+    """
+    Watch the stories and photos directories with watchdog (inotify/FSEvents) so the story list
+    and photo index are updated on change instead of by stat/TTL checks.
+    Returns the started Observer, or None if watchdog isn't installed.
+    """
+    global STORIES_WATCHED, PHOTOS_WATCHED
+    if not HAS_WATCHDOG:
+        return None
+    
+    observer = Observer()
+    stories_path = os.path.join(os.path.dirname(__file__), STORIES_DIR)
+    if os.path.isdir(stories_path):
+        observer.schedule(StoriesEventHandler(), stories_path, recursive=False)
+        STORIES_CACHE['stale'] = True
+        STORIES_WATCHED = True
+    if os.path.isdir(PHOTOS_BASE_PATH):
+        observer.schedule(PhotosEventHandler(), PHOTOS_BASE_PATH, recursive=True)
+        PHOTOS_WATCHED = True
+    observer.daemon = True
+    observer.start()
+    return observer
+
+def get_index_rows():
+    """(filename, title, date, total_photos, photo) for each story, in get_all_stories() order"""
+    get_all_stories()  # Refreshes STORIES_CACHE if the stories changed
+    return STORIES_CACHE['index_rows']
+
 # HTML Templates
 INDEX_TEMPLATE = """
 <!DOCTYPE html>
@@ -203,15 +452,15 @@ INDEX_TEMPLATE = """
     <div class="container">
         <h1>Photo Stories</h1>
         <ul class="story-list">
-            {% for story in stories %}
+            {% for filename, title, date, total_photos, photo in stories %}
             <li class="story-item">
-                <a href="/story/{{ story.filename }}">
-                    <div class="story-title">{{ story.title }}</div>
+                <a href="/story/{{ filename }}">
+                    <div class="story-title">{{ title }}</div>
                     <div class="story-meta">
-                        <span>📅 {{ story.date }}</span>
-                        <span>📷 <span class="count">{{ story.total_photos }}</span> photos</span>
-                        {% if story.photo %}
-                        <span>🖼️ {{ story.photo }}</span>
+                        <span>📅 {{ date }}</span>
+                        <span>📷 <span class="count">{{ total_photos }}</span> photos</span>
+                        {% if photo %}
+                        <span>🖼️ {{ photo }}</span>
                         {% endif %}
                     </div>
                 </a>
@@ -348,11 +597,15 @@ STORY_TEMPLATE = """
 </html>
 """
 
+# Templates compiled once with Flask's Jinja environment (same autoescaping as render_template_string,
+# which would re-parse and re-compile the template source on every request)
+INDEX_PAGE = app.jinja_env.from_string(INDEX_TEMPLATE)
+STORY_PAGE = app.jinja_env.from_string(STORY_TEMPLATE)
+
 @app.route('/')
 def index():
     """Index page showing all stories"""
-    stories = get_all_stories()
-    return render_template_string(INDEX_TEMPLATE, stories=stories)
+    return INDEX_PAGE.render(stories=get_index_rows())
 
 @app.route('/story/<filename>')
 def story(filename):
@@ -360,56 +613,96 @@ def story(filename):
     stories_path = os.path.join(os.path.dirname(__file__), STORIES_DIR)
     filepath = os.path.join(stories_path, filename)
     
-    if not os.path.exists(filepath):
+    # The stat supplies the cache key; a missing file (or a directory) is a 404 either way
+    try:
+        mtime_ns = os.stat(filepath).st_mtime_ns
+        story, story_html = render_story_cached(filepath, mtime_ns)
+    except (FileNotFoundError, IsADirectoryError, NotADirectoryError):
         abort(404)
     
-    story = parse_story_file(filepath)
-    
-    # Convert markdown to HTML
-    if HAS_MARKDOWN:
-        story_html = markdown(story['story_content'])
-    else:
-        # Simple conversion: preserve paragraphs and line breaks
-        content = story['story_content']
-        paragraphs = [p.strip() for p in content.split('\n\n') if p.strip()]
-        story_html = '\n'.join(f'<p>{p.replace(chr(10), "<br>")}</p>' for p in paragraphs)
-    
     # Try to find photo path
     photo_path = None
     if story['photo']:
         photo_path = find_photo_path(story['photo'])
     
-    return render_template_string(
-        STORY_TEMPLATE,
-        story=story,
-        story_html=story_html,
-        photo_path=photo_path,
-        photos_base_path=PHOTOS_BASE_PATH
-    )
+    # The page only changes with the story file and whether its photo was found, so browsers
+    # revalidate with If-None-Match and get a 304 without the page being rendered
+    etag = f"{mtime_ns:x}-{int(photo_path is not None)}"
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(STORY_PAGE.render(
+            story=story,
+            story_html=story_html,
+            photo_path=photo_path,
+            photos_base_path=PHOTOS_BASE_PATH
+        ), mimetype='text/html')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
 
 @app.route('/photo/<photo_filename>')
 def serve_photo(photo_filename):
     """Serve photo files"""
     photo_path = find_photo_path(photo_filename)
     
-    if not photo_path or not os.path.exists(photo_path):
+    if not photo_path:
         abort(404)
     
-    directory = os.path.dirname(photo_path)
-    filename = os.path.basename(photo_path)
+    # Hand the transfer to nginx (sendfile from its internal location) when configured;
+    # nginx answers 404 itself if the file has gone since it was indexed
+    if X_ACCEL_PHOTOS_PREFIX:
+        relative_path = os.path.relpath(photo_path, PHOTOS_BASE_PATH).replace(os.sep, '/')
+        return Response(
+            mimetype=mimetypes.guess_type(photo_path)[0] or 'application/octet-stream',
+            headers={'X-Accel-Redirect': X_ACCEL_PHOTOS_PREFIX + quote(relative_path)}
+        )
     
-    return send_from_directory(directory, filename)
+    # photo_path comes from the index, so it's sent directly (no safe_join against a directory).
+    # The body is streamed through the server's wsgi.file_wrapper (sendfile where supported),
+    # and conditional GETs (ETag/Last-Modified) are answered with 304s.
+    # send_file stats the file anyway, so a photo removed since indexing surfaces here
+    try:
+        response = send_file(photo_path, conditional=True, max_age=PHOTO_MAX_AGE)
+    except FileNotFoundError:
+        abort(404)
+    response.cache_control.immutable = True
+    return response
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Web viewer for generated photo stories')
+    parser.add_argument('--host', type=str, default='127.0.0.1',
+                       help='Host to bind to (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=5000,
+                       help='Port to bind to (default: 5000)')
+    parser.add_argument('--debug', action='store_true',
+                       help="Run Flask's debug server (auto-reload, debugger) instead of waitress")
+    
+    args = parser.parse_args()
+    
     # Check if photos directory exists
     if not os.path.exists(PHOTOS_BASE_PATH):
         print(f"WARNING: Photos directory not found: {PHOTOS_BASE_PATH}")
         print("Image previews will not work until the directory is available.")
+    else:
+        print(f"Indexing photos in {PHOTOS_BASE_PATH}...")
+        print(f"Indexed {init_photo_index():,} files")
+    
+    if start_watchers():
+        print("Watching stories and photos directories for changes")
+    else:
+        print("watchdog not installed - checking for changes by mtime/TTL")
     
     print("Starting Flask app...")
     print(f"Stories directory: {os.path.join(os.path.dirname(__file__), STORIES_DIR)}")
     print(f"Photos base path: {PHOTOS_BASE_PATH}")
-    print("\nOpen your browser to: http://127.0.0.1:5000")
+    print(f"\nOpen your browser to: http://{args.host}:{args.port}")
     
-    app.run(debug=True, host='127.0.0.1', port=5000)
-
+    if args.debug:
+        app.run(debug=True, host=args.host, port=args.port)
+    elif HAS_WAITRESS:
+        serve(app, host=args.host, port=args.port, threads=SERVER_THREADS)
+    else:
+        app.run(host=args.host, port=args.port, threaded=True)